@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Benchmark of bcrypt hash time by work factor
+
+Times password hashes at each cost, first one at a time and then through a
+PasswordHasher pool hit by concurrent logins, to pick REL8_BCRYPT_ROUNDS and
+REL8_BCRYPT_WORKERS against the login latency budget. No database is needed:
+
+    python3 -m bench.bcrypt_cost --rounds 10 11 12 13 --logins 32
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import time
+from rel8.passwords import hash_password, PasswordHasher
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, nargs='+',
+                        default=[10, 11, 12, 13])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--logins', type=int, default=16,
+                        help='concurrent logins checked through the pool')
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    print('{:>8} {:>12} {:>12} {:>14} {:>14}'.format(
+        'rounds', 'hash ms', 'p95 ms', 'pool p50 ms', 'pool p95 ms'))
+    for rounds in args.rounds:
+        inline = [timed(hash_password, 'correct horse', rounds)
+                  for _ in range(args.repeat)]
+        hasher = PasswordHasher(rounds=rounds, workers=args.workers)
+        pw_hash = hasher.generate_password_hash('correct horse')
+        with ThreadPoolExecutor(max_workers=args.logins) as pool:
+            waits = list(pool.map(
+                lambda _: timed(hasher.check_password_hash, pw_hash,
+                                'correct horse'),
+                range(args.logins)))
+        hasher.shutdown()
+        print('{:>8} {:>12.1f} {:>12.1f} {:>14.1f} {:>14.1f}'.format(
+            rounds, sum(inline) / len(inline) * 1000,
+            percentile(inline, 95) * 1000, percentile(waits, 50) * 1000,
+            percentile(waits, 95) * 1000))
+
+
+if __name__ == '__main__':
+    main()
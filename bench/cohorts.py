@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Benchmark of the cohort analytics over every user's history
+
+Generates a power-law history with bench.generate_dataset, then runs
+rel8.analytics.analyze_cohort at several chunk sizes and reports sessions
+aggregated per second and the peak memory traced while aggregating, which
+should follow the chunk size rather than the history size.
+
+It runs on a scratch SQLite file in the temp directory unless a database is
+configured, which then needs HBNB_ENV=test since every table is dropped:
+
+    python3 -m bench.cohorts --users 20000 --batch-sizes 10000 100000
+"""
+import argparse
+from bench.common import scratch_file, use_scratch_database
+import random
+import time
+import tracemalloc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--max-responses', type=int, default=100000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+',
+                        default=[10000, 100000])
+    parser.add_argument('--predictor', default='coffee')
+    parser.add_argument('--outcome', default='headache')
+    args = parser.parse_args()
+
+    use_scratch_database(scratch_file('rel8-cohorts.db'))
+
+    import models
+    from bench.generate_dataset import generate, power_law_sizes
+    from rel8.analytics import analyze_cohort
+
+    rng = random.Random(8)
+    sizes = power_law_sizes(args.users, args.max_responses, 1.1, 20, rng)
+    generate(models.storage, sizes, rng)
+
+    print('{:>12} {:>12} {:>10} {:>14} {:>10}'.format(
+        'batch size', 'sessions', 'seconds', 'sessions/s', 'peak MB'))
+    for batch_size in args.batch_sizes:
+        tracemalloc.start()
+        start = time.perf_counter()
+        summary = analyze_cohort(models.storage, args.predictor, args.outcome,
+                                 batch_size=batch_size, min_users=1)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print('{:>12} {:>12} {:>10.2f} {:>14.0f} {:>10.1f}'.format(
+            batch_size, summary['sessions'], elapsed,
+            summary['sessions'] / elapsed if elapsed else 0.0,
+            peak / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main()
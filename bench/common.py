@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""Helpers shared by the benchmarks"""
+import os
+import sys
+import tempfile
+
+
+def use_scratch_database(sqlite_path=':memory:'):
+    """
+    Points storage at a throwaway database and recreates its tables
+
+    Without any database configured the benchmarks run on SQLite, in a
+    temporary file of the process unless a path is given. A configured
+    database is used only with HBNB_ENV=test, because every table is dropped.
+    """
+    if not (os.getenv('REL8_DATABASE_URL') or os.getenv('REL8_DB_BACKEND')):
+        os.environ['REL8_DB_BACKEND'] = 'sqlite'
+        if sqlite_path != ':memory:' and not os.getenv('REL8_SQLITE_PATH'):
+            os.environ['REL8_SQLITE_PATH'] = sqlite_path
+        os.environ['HBNB_ENV'] = 'test'
+    if os.getenv('HBNB_ENV') != 'test':
+        sys.exit('Refusing to run without HBNB_ENV=test (tables are dropped)')
+
+    import models
+    models.storage.create_schema()
+
+
+def scratch_file(name):
+    """Returns a path for a scratch SQLite file in the temp directory"""
+    return os.path.join(tempfile.gettempdir(), name)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Benchmark of the NDJSON export against ORM objects and to_dict
+
+Generates a history with bench.generate_dataset and exports every session
+and response twice: loading ORM objects and dumping their to_dict(), then
+through rel8.export from column tuples, plain and gzipped. Reports rows per
+second and output size.
+
+It runs on a scratch SQLite file in the temp directory unless a database is
+configured, which then needs HBNB_ENV=test since every table is dropped:
+
+    python3 -m bench.export --users 200 --max-responses 50000
+"""
+import argparse
+from bench.common import scratch_file, use_scratch_database
+import json
+import random
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--max-responses', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    use_scratch_database(scratch_file('rel8-export.db'))
+
+    import models
+    from bench.generate_dataset import generate, power_law_sizes
+    from models.response import Response
+    from models.session import Session
+    from rel8.export import export_lines, gzip_chunks
+
+    rng = random.Random(8)
+    generate(models.storage, power_law_sizes(
+        args.users, args.max_responses, 1.1, 20, rng), rng)
+    storage = models.storage
+    rows = storage.count(Session) + storage.count(Response)
+
+    def orm():
+        size = 0
+        for cls in (Session, Response):
+            for obj in storage.all(cls, stream=True,
+                                   batch_size=args.batch_size):
+                size += len(json.dumps(obj.to_dict(), default=str)) + 1
+        storage.close()
+        return size
+
+    def compiled():
+        return sum(len(chunk) for chunk in export_lines(
+            storage, batch_size=args.batch_size))
+
+    def gzipped():
+        return sum(len(chunk) for chunk in gzip_chunks(export_lines(
+            storage, batch_size=args.batch_size)))
+
+    print('{:>10} {:>10} {:>14} {:>10}'.format('', 'seconds', 'rows/s', 'MB'))
+    for name, fn in (('to_dict', orm), ('compiled', compiled),
+                     ('gzip', gzipped)):
+        start = time.perf_counter()
+        size = fn()
+        elapsed = time.perf_counter() - start
+        print('{:>10} {:>10.2f} {:>14.0f} {:>10.1f}'.format(
+            name, elapsed, rows / elapsed, size / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main()
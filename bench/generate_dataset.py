@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Synthetic large-history dataset generator
+
+Fills users, predictors, outcomes, intervals, sessions, responses and
+user_stats with bulk inserts. Responses per user follow a Pareto power law
+capped at --max-responses, so a few heavy trackers carry most of the rows.
+Sessions are predictor texts, most of them paired with an outcome after an
+exponentially distributed lag.
+
+It writes to rel8-dataset.db in the temp directory unless a database is
+configured, which then needs HBNB_ENV=test since every table is dropped.
+Point the app at the file with REL8_DB_BACKEND=sqlite REL8_SQLITE_PATH=...
+
+    python3 -m bench.generate_dataset --users 10000 --max-responses 500000
+"""
+import argparse
+from bench.common import scratch_file, use_scratch_database
+from datetime import datetime, timedelta
+import random
+import time
+
+
+def add_user(rows, phone, now):
+    """Queues a user with variables and returns its id and variable ids"""
+    from models.base_model import new_id
+    from models.interval import Interval
+    from models.outcome import Outcome
+    from models.predictor import Predictor
+    from models.user import User
+
+    ids = {'user': new_id(), 'predictor': new_id(),
+           'outcome': new_id(), 'interval': new_id()}
+    common = {'created_at': now, 'updated_at': now}
+    rows[User].append(dict(
+        common, id=ids['user'], username='user{}'.format(phone[-7:]),
+        access_code='0' * 16, phone_number=phone, timezone='US/Eastern'))
+    rows[Predictor].append(dict(common, id=ids['predictor'], name='coffee',
+                                user_id=ids['user']))
+    rows[Outcome].append(dict(common, id=ids['outcome'], name='headache',
+                              user_id=ids['user']))
+    rows[Interval].append(dict(common, id=ids['interval'], duration=4,
+                               user_id=ids['user']))
+    return ids
+
+
+def add_history(rows, ids, responses, rng, now, flush):
+    """Queues about `responses` responses of one user, oldest first"""
+    from models.base_model import new_id
+    from models.response import Response
+    from models.session import Session
+    from models.user_stat import UserStat
+    from rel8.utils import minutes_between
+
+    stat = UserStat(user_id=ids['user'])
+    stat.reset()
+    sessions = max(1, int(responses / 1.8))
+    at = now - timedelta(hours=8 * sessions)
+    written = 0
+    for i in range(sessions):
+        at += timedelta(minutes=rng.uniform(60, 660))
+        session_id = new_id()
+        paired = written + 1 < responses and rng.random() < 0.8
+        closed_at = at
+        rows[Response].append({
+            'id': new_id(), 'created_at': at, 'updated_at': at,
+            'session_id': session_id, 'predictor_id': ids['predictor'],
+            'outcome_id': None, 'user_id': ids['user'], 'message': 'coffee',
+            'error': False})
+        written += 1
+        if paired:
+            closed_at = at + timedelta(minutes=min(rng.expovariate(1 / 90), 239))
+            rows[Response].append({
+                'id': new_id(), 'created_at': closed_at,
+                'updated_at': closed_at, 'session_id': session_id,
+                'predictor_id': None, 'outcome_id': ids['outcome'],
+                'user_id': ids['user'], 'message': 'headache',
+                'error': False})
+            written += 1
+            stat.record_pair(minutes_between(at, closed_at))
+        else:
+            stat.record_unpaired()
+        rows[Session].append({
+            'id': session_id, 'created_at': at, 'updated_at': closed_at,
+            'user_id': ids['user'], 'interval_id': ids['interval'],
+            'complete': True})
+        at = closed_at
+        if len(rows[Response]) >= 20000:
+            flush()
+        if written >= responses:
+            break
+    rows[UserStat].append({
+        'id': new_id(), 'created_at': now, 'updated_at': now,
+        'user_id': ids['user'], 'paired': stat.paired,
+        'unpaired': stat.unpaired, 'lag_mean': stat.lag_mean,
+        'lag_m2': stat.lag_m2, 'lag_histogram': stat.lag_histogram})
+    return written
+
+
+def generate(storage, sizes, rng, progress=None):
+    """
+    Creates one user per entry of sizes with that many responses
+    Returns:
+        list of (user_id, phone_number, responses written) tuples
+    """
+    from models.interval import Interval
+    from models.outcome import Outcome
+    from models.predictor import Predictor
+    from models.response import Response
+    from models.session import Session
+    from models.user import User
+    from models.user_stat import UserStat
+
+    order = (User, Predictor, Outcome, Interval, Session, Response, UserStat)
+    rows = {cls: [] for cls in order}
+
+    def flush():
+        for cls in order:
+            if rows[cls]:
+                storage.bulk_insert(cls, rows[cls])
+                rows[cls] = []
+        storage.save()
+
+    now = datetime.utcnow()
+    users = []
+    for i, responses in enumerate(sizes):
+        phone = '+1555{:07d}'.format(i)
+        ids = add_user(rows, phone, now)
+        written = add_history(rows, ids, responses, rng, now, flush)
+        users.append((ids['user'], phone, written))
+        if progress and (i + 1) % 100 == 0:
+            flush()
+            progress(i + 1)
+    flush()
+    storage.close()
+    return users
+
+
+def power_law_sizes(users, max_responses, alpha, min_responses, rng):
+    return [min(max_responses, int(min_responses * rng.paretovariate(alpha)))
+            for _ in range(users)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--max-responses', type=int, default=500000)
+    parser.add_argument('--min-responses', type=int, default=20)
+    parser.add_argument('--alpha', type=float, default=1.1,
+                        help='Pareto shape, lower means heavier tail.')
+    parser.add_argument('--seed', type=int, default=8)
+    args = parser.parse_args()
+
+    use_scratch_database(scratch_file('rel8-dataset.db'))
+
+    import models
+
+    rng = random.Random(args.seed)
+    sizes = power_law_sizes(args.users, args.max_responses,
+                            args.alpha, args.min_responses, rng)
+    start = time.perf_counter()
+    users = generate(models.storage, sizes, rng,
+                     progress=lambda n: print('{} users'.format(n)))
+    elapsed = time.perf_counter() - start
+    total = sum(written for user_id, phone, written in users)
+    print('{} users, {} responses (max {}) in {:.1f}s, {:.0f} rows/s'.format(
+        len(users), total, max(written for _, _, written in users),
+        elapsed, total / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Benchmark of predictor/outcome texts against the size of the history
+
+Seeds one user per history size with that many sessions, the newest one open,
+then times DBStorage.current_session alone and whole /sms requests through
+the Flask test client, alternating the outcome closing the open session with
+the predictor opening the next one. Neither cost should move with the
+history size.
+
+It runs on a scratch SQLite file unless a database is configured, which then
+needs HBNB_ENV=test since every table is dropped:
+
+    python3 -m bench.open_session --sizes 10 1000 100000
+"""
+import argparse
+from bench.common import use_scratch_database
+from datetime import datetime, timedelta
+import time
+import uuid
+
+
+def seed_user(storage, size, batch_size=10000):
+    from models.interval import Interval
+    from models.outcome import Outcome
+    from models.predictor import Predictor
+    from models.session import Session
+    from models.user import User
+
+    user = User(
+        username='bench-{}'.format(size),
+        access_code='0' * 16,
+        phone_number='+1555{:07d}'.format(size % 10000000)
+    )
+    storage.new(user)
+    interval = Interval(duration=1, user_id=user.id)
+    storage.new(interval)
+    storage.new(Predictor(name='coffee', user_id=user.id))
+    storage.new(Outcome(name='headache', user_id=user.id))
+    storage.save()
+
+    now = datetime.utcnow()
+    rows = []
+    for i in range(size):
+        created_at = now - timedelta(minutes=size - i)
+        rows.append({
+            'id': str(uuid.uuid4()),
+            'created_at': created_at,
+            'updated_at': created_at,
+            'user_id': user.id,
+            'interval_id': interval.id,
+            'complete': i != size - 1
+        })
+        if len(rows) == batch_size:
+            storage.bulk_insert(Session, rows)
+            storage.save()
+            rows = []
+    if rows:
+        storage.bulk_insert(Session, rows)
+        storage.save()
+    return user
+
+
+def time_lookup(storage, user_id, repeat):
+    storage.current_session(user_id)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        storage.current_session(user_id)
+    return (time.perf_counter() - start) / repeat
+
+
+def time_texts(client, phone_number, repeat):
+    """Returns the mean seconds per /sms text, outcomes and predictors"""
+    def text(body, i):
+        client.post('/sms', data={
+            'MessageSid': 'SMbench{}{}{}'.format(phone_number, body, i),
+            'From': phone_number, 'Body': body})
+
+    text('headache', 'warmup')
+    text('coffee', 'warmup')
+    start = time.perf_counter()
+    for i in range(repeat):
+        text('headache', i)
+        text('coffee', i)
+    return (time.perf_counter() - start) / (2 * repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10, 1000, 100000])
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    use_scratch_database()
+
+    import models
+    from rel8.app import app
+
+    client = app.test_client()
+    print('{:>10} {:>14} {:>12}'.format('sessions', 'us/lookup', 'ms/text'))
+    for size in args.sizes:
+        user = seed_user(models.storage, size)
+        per_call = time_lookup(models.storage, user.id, args.repeat)
+        models.storage.close()
+        per_text = time_texts(client, user.phone_number, args.repeat)
+        print('{:>10} {:>14.1f} {:>12.2f}'.format(
+            size, per_call * 1e6, per_text * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Benchmark of scanning responses with and without inline payloads
+
+Fills the narrow responses table, with payloads archived in
+response_payloads, and a copy laid out like responses before the archive
+(twilio_json inline) with the same rows and realistic Twilio payloads. Then
+times the scans the dashboard and CSV export do on each, and compares the
+bytes taken by inline JSON and by the compressed archive.
+
+It runs on a scratch SQLite file in the temp directory unless a database is
+configured, which then needs HBNB_ENV=test since every table is dropped:
+
+    python3 -m bench.payload_scan --rows 500000
+"""
+import argparse
+from bench.common import scratch_file, use_scratch_database
+from bench.sms_load import twilio_form
+from datetime import datetime, timedelta
+import json
+import time
+import uuid
+
+
+def timed(conn, query, repeat):
+    conn.execute(query).fetchall()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(query).fetchall()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    use_scratch_database(scratch_file('rel8-payload-scan.db'))
+
+    from sqlalchemy import Column, func, MetaData, select, Table, Text
+    import models
+    from models.interval import Interval
+    from models.response import Response
+    from models.response_payload import pack_payload, ResponsePayload
+    from models.session import Session
+    from models.user import User
+
+    storage = models.storage
+    user = User(username='scan', access_code='0' * 16,
+                phone_number='+15550000001')
+    interval = Interval(duration=1, user_id=user.id)
+    session = Session(user_id=user.id, interval_id=interval.id)
+    for obj in (user, interval, session):
+        storage.new(obj)
+    storage.save()
+
+    wide = Table('responses_inline', MetaData(),
+                 *[column.copy() for column in Response.__table__.columns],
+                 Column('twilio_json', Text, nullable=False))
+    wide.drop(storage.engine, checkfirst=True)
+    wide.create(storage.engine)
+
+    now = datetime.utcnow()
+    inline_bytes = archived_bytes = 0
+    for start in range(0, args.rows, args.batch_size):
+        responses, payloads, inline = [], [], []
+        for i in range(start, min(args.rows, start + args.batch_size)):
+            at = now - timedelta(minutes=args.rows - i)
+            row = {'id': str(uuid.uuid4()), 'created_at': at,
+                   'updated_at': at, 'session_id': session.id,
+                   'predictor_id': None, 'outcome_id': None,
+                   'user_id': user.id, 'message': 'coffee', 'error': False}
+            payload = twilio_form(user.phone_number, 'coffee')
+            raw = json.dumps(payload)
+            packed = pack_payload(payload)
+            inline_bytes += len(raw)
+            archived_bytes += len(packed)
+            responses.append(row)
+            inline.append(dict(row, twilio_json=raw))
+            payloads.append({'id': str(uuid.uuid4()), 'created_at': at,
+                             'updated_at': at, 'response_id': row['id'],
+                             'payload': packed})
+        storage.bulk_insert(Response, responses)
+        storage.bulk_insert(ResponsePayload, payloads)
+        storage.save()
+        with storage.engine.begin() as conn:
+            conn.execute(wide.insert(), inline)
+    storage.close()
+
+    narrow = Response.__table__
+    print('{:>24} {:>12} {:>12}'.format('(ms)', 'inline', 'archived'))
+    with storage.engine.connect() as conn:
+        for name, query in (
+                ('count', lambda t: select([func.count()]).select_from(t)),
+                ('scan texts', lambda t: select(
+                    [t.c.session_id, t.c.updated_at, t.c.message])),
+                ('scan user texts', lambda t: select(
+                    [t.c.updated_at, t.c.message]).where(
+                        t.c.user_id == user.id))):
+            print('{:>24} {:>12.1f} {:>12.1f}'.format(
+                name, timed(conn, query(wide), args.repeat),
+                timed(conn, query(narrow), args.repeat)))
+    print('{:>24} {:>12.1f} {:>12.1f}'.format(
+        'payload MB', inline_bytes / 1024 / 1024,
+        archived_bytes / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main()
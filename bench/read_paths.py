@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Benchmarks of the read paths across history sizes
+
+Generates one user per size with bench.generate_dataset, then times the
+dashboard, the full CSV download (and its first chunk) and the DBStorage
+queries behind them for each user. Flat rows mean the path does not scale
+with history; results can also be saved as JSON.
+
+It runs on a scratch SQLite file unless a database is configured, which then
+needs HBNB_ENV=test since every table is dropped:
+
+    python3 -m bench.read_paths --sizes 100 10000 500000
+"""
+import argparse
+from bench.common import use_scratch_database
+import json
+import random
+import time
+
+
+def timed(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['_fresh'] = True
+
+
+def download_csv(client):
+    """Returns the seconds to the first chunk and to the last one"""
+    start = time.perf_counter()
+    response = client.get('/csv', buffered=False)
+    chunks = iter(response.response)
+    next(chunks, None)
+    first = time.perf_counter() - start
+    for chunk in chunks:
+        pass
+    response.close()
+    return first * 1000, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[100, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    use_scratch_database()
+
+    import models
+    from models.response import Response
+    from bench.generate_dataset import generate
+    from rel8.app import app, DASHBOARD_PAGE_SIZE
+
+    app.secret_key = app.secret_key or 'bench'
+    app.config['WTF_CSRF_ENABLED'] = False
+    users = generate(models.storage, args.sizes, random.Random(8))
+    storage = models.storage
+
+    columns = ('responses', 'dashboard', 'csv first', 'csv total',
+               'open session', 'page', 'count', 'stats')
+    print(''.join('{:>14}'.format(column) for column in columns) + '  (ms)')
+    results = []
+    for user_id, phone, written in users:
+        client = app.test_client()
+        login(client, user_id)
+        csv_first, csv_total = download_csv(client)
+        row = {
+            'responses': written,
+            'dashboard': timed(lambda: client.get('/dashboard'), args.repeat),
+            'csv first': csv_first,
+            'csv total': csv_total,
+            'open session': timed(
+                lambda: storage.current_session(user_id), args.repeat),
+            'page': timed(lambda: storage.sessions_page(
+                user_id, DASHBOARD_PAGE_SIZE), args.repeat),
+            'count': timed(
+                lambda: storage.count(Response, user_id=user_id), args.repeat),
+            'stats': timed(lambda: storage.get_stats(user_id), args.repeat)
+        }
+        storage.close()
+        results.append(row)
+        print('{:>14}'.format(written) + ''.join(
+            '{:>14.2f}'.format(row[column]) for column in columns[1:]))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'database': storage.engine.url.drivername,
+                       'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Benchmark of the reminder dispatcher draining a backlog
+
+Seeds users with one open session each, a share of them inside the reminder
+window, and times ReminderDispatcher sending them through a StubTransport
+that sleeps like a provider round-trip. Reports the claim query cost and the
+reminders sent per minute for the given rate and concurrency.
+
+It runs on a scratch SQLite file in the temp directory unless a database is
+configured, which then needs HBNB_ENV=test since every table is dropped:
+
+    python3 -m bench.reminders --users 50000 --rate 1000 --latency 0.05
+"""
+import argparse
+from bench.common import scratch_file, use_scratch_database
+from datetime import datetime, timedelta
+import random
+import time
+import uuid
+
+
+def seed_sessions(storage, due_share, rng):
+    """Opens a session for every user, returns how many are due a reminder"""
+    from sqlalchemy import select
+    from models.interval import Interval
+    from models.session import Session
+
+    intervals = Interval.__table__
+    with storage.engine.connect() as conn:
+        rows = conn.execute(
+            select([intervals.c.id, intervals.c.user_id])).fetchall()
+    now = datetime.utcnow()
+    sessions = []
+    due = 0
+    for interval_id, user_id in rows:
+        if rng.random() < due_share:
+            created_at = now - timedelta(minutes=rng.uniform(46, 59))
+            due += 1
+        else:
+            created_at = now - timedelta(minutes=rng.uniform(0, 44))
+        sessions.append({'id': str(uuid.uuid4()), 'created_at': created_at,
+                         'updated_at': created_at, 'user_id': user_id,
+                         'interval_id': interval_id, 'complete': False})
+    storage.bulk_insert(Session, sessions)
+    storage.save()
+    storage.close()
+    return due
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--due-share', type=float, default=0.5)
+    parser.add_argument('--rate', type=float, default=1000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds each stub send takes')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    use_scratch_database(scratch_file('rel8-reminders.db'))
+
+    import models
+    from bench.sms_load import seed
+    from rel8.reminders import ReminderDispatcher, ReminderSender
+    from rel8.reminders import StubTransport
+
+    storage = models.storage
+    seed(storage, args.users)
+    due = seed_sessions(storage, args.due_share, random.Random(8))
+
+    start = time.perf_counter()
+    claimed = sum(len(rows) for rows in storage.claim_reminders(
+        timedelta(minutes=15), now=datetime.utcnow() - timedelta(days=1),
+        batch_size=args.batch_size))
+    claim_ms = (time.perf_counter() - start) * 1000
+
+    transport = StubTransport(latency=args.latency)
+    sender = ReminderSender(transport, rate=args.rate,
+                            concurrency=args.concurrency)
+    dispatcher = ReminderDispatcher(storage, sender, lead=15,
+                                    batch_size=args.batch_size)
+    start = time.perf_counter()
+    sent, failed = dispatcher.dispatch()
+    elapsed = time.perf_counter() - start
+
+    print('{} users, {} due, empty claim pass {:.1f} ms ({} rows)'.format(
+        args.users, due, claim_ms, claimed))
+    print('{} sent, {} failed in {:.1f} s: {:.0f} reminders/min'.format(
+        sent, failed, elapsed, sent / elapsed * 60 if elapsed else 0.0))
+
+
+if __name__ == '__main__':
+    main()
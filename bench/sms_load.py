@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Load test of the /sms webhook under concurrent Twilio traffic
+
+Starts the app on a local port, seeds users with variables and replays a mix
+of Twilio-shaped POSTs from concurrent clients: predictor and outcome texts,
+words matching no variable and three-message enrollments of new numbers.
+Throughput, latency percentiles and SQL queries per request are printed and
+saved as JSON so runs can be compared across commits.
+
+It runs on a scratch SQLite file in the temp directory unless a database is
+configured, which then needs HBNB_ENV=test since every table is dropped:
+
+    python3 -m bench.sms_load --users 1000 --requests 20000 --clients 32 \\
+        --output sms_load.json
+"""
+import argparse
+from bench.common import scratch_file, use_scratch_database
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+import json
+import random
+import subprocess
+import threading
+import time
+from urllib.parse import urlencode
+from urllib.request import build_opener, HTTPCookieProcessor
+import uuid
+
+
+MIX = (('predictor', 40), ('outcome', 40), ('mismatch', 10), ('enroll', 10))
+
+
+def seed(storage, users):
+    """Inserts users with a predictor, an outcome and a one hour interval"""
+    from datetime import datetime
+    from models.interval import Interval
+    from models.outcome import Outcome
+    from models.predictor import Predictor
+    from models.user import User
+
+    now = datetime.utcnow()
+    rows = {User: [], Predictor: [], Outcome: [], Interval: []}
+    phones = []
+    for i in range(users):
+        user_id = str(uuid.uuid4())
+        phone = '+1555{:07d}'.format(i)
+        phones.append(phone)
+        common = {'created_at': now, 'updated_at': now}
+        rows[User].append(dict(common, id=user_id, username='load{}'.format(i),
+                               access_code='0' * 16, phone_number=phone,
+                               timezone='US/Pacific'))
+        rows[Predictor].append(dict(common, id=str(uuid.uuid4()),
+                                    name='coffee', user_id=user_id))
+        rows[Outcome].append(dict(common, id=str(uuid.uuid4()),
+                                  name='headache', user_id=user_id))
+        rows[Interval].append(dict(common, id=str(uuid.uuid4()),
+                                   duration=1, user_id=user_id))
+    for cls in (User, Predictor, Outcome, Interval):
+        storage.bulk_insert(cls, rows[cls])
+    storage.save()
+    storage.close()
+    return phones
+
+
+def twilio_form(phone, body):
+    return {
+        'MessageSid': 'SM' + uuid.uuid4().hex,
+        'AccountSid': 'AC' + '0' * 32,
+        'From': phone,
+        'To': '+15550000000',
+        'Body': body,
+        'NumMedia': '0',
+        'NumSegments': '1',
+        'SmsStatus': 'received',
+        'ApiVersion': '2010-04-01'
+    }
+
+
+class Client:
+    """One simulated phone posting to the webhook"""
+    def __init__(self, url, phone):
+        self.url = url
+        self.phone = phone
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+
+    def send(self, body):
+        data = urlencode(twilio_form(self.phone, body)).encode()
+        start = time.perf_counter()
+        with self.opener.open(self.url, data=data, timeout=30) as reply:
+            reply.read()
+            status = reply.status
+        return time.perf_counter() - start, status
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def run(url, phones, requests, clients, seed_value):
+    rng = random.Random(seed_value)
+    kinds = [kind for kind, weight in MIX for _ in range(weight)]
+    plan = [rng.choice(kinds) for _ in range(requests)]
+    latencies = {kind: [] for kind, weight in MIX}
+    errors = []
+    lock = threading.Lock()
+    enrolled = iter(range(10 ** 7))
+
+    def task(kind):
+        try:
+            if kind == 'enroll':
+                with lock:
+                    phone = '+1556{:07d}'.format(next(enrolled))
+                client = Client(url, phone)
+                results = [client.send(body) for body in ('hi', 'yes', 'Load')]
+            else:
+                client = Client(url, rng.choice(phones))
+                body = {'predictor': 'coffee', 'outcome': 'headache',
+                        'mismatch': 'tea'}[kind]
+                results = [client.send(body)]
+        except Exception as error:
+            with lock:
+                errors.append(repr(error))
+            return
+        with lock:
+            for latency, status in results:
+                if status != 200:
+                    errors.append('HTTP {}'.format(status))
+                latencies[kind].append(latency)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(task, plan))
+    return time.perf_counter() - start, latencies, errors
+
+
+def summarize(latencies):
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'mean_ms': sum(values) / len(values) * 1000 if values else 0.0,
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'max_ms': values[-1] * 1000 if values else 0.0
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=8)
+    parser.add_argument('--output', default='sms_load.json')
+    args = parser.parse_args()
+
+    use_scratch_database(scratch_file('rel8-sms-load.db'))
+
+    from sqlalchemy import event
+    from werkzeug.serving import make_server
+    import models
+    from rel8.app import app
+
+    app.secret_key = app.secret_key or 'bench'
+    phones = seed(models.storage, args.users)
+
+    queries = [0]
+
+    def count_query(*args):
+        queries[0] += 1
+
+    event.listen(models.storage.engine, 'before_cursor_execute', count_query)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/sms'.format(server.server_port)
+
+    elapsed, latencies, errors = run(
+        url, phones, args.requests, args.clients, args.seed)
+    server.shutdown()
+
+    every = [latency for values in latencies.values() for latency in values]
+    result = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'database': models.storage.engine.url.drivername,
+        'config': vars(args),
+        'elapsed_s': elapsed,
+        'throughput_rps': len(every) / elapsed if elapsed else 0.0,
+        'queries_per_request': queries[0] / len(every) if every else 0.0,
+        'errors': len(errors),
+        'error_samples': errors[:10],
+        'latency': summarize(every),
+        'by_kind': {kind: summarize(values)
+                    for kind, values in latencies.items()}
+    }
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    print('{:.0f} req/s, p50 {:.1f} ms, p95 {:.1f} ms, p99 {:.1f} ms, '
+          '{:.1f} queries/req, {} errors -> {}'.format(
+              result['throughput_rps'], result['latency']['p50_ms'],
+              result['latency']['p95_ms'], result['latency']['p99_ms'],
+              result['queries_per_request'], result['errors'], args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Benchmark of cold start: import time, first query and first request
+
+Starts fresh interpreters that import models or rel8.app and time the
+import, the first storage query (which connects and creates or checks the
+schema, see REL8_SCHEMA) and, for the app, the first request. A last run
+queries from forked children after the parent has connected, as a preforking
+server does, and checks the parent's connection still works afterwards.
+
+It runs on a scratch SQLite file in the temp directory unless a database is
+configured, which then needs HBNB_ENV=test since every table is dropped:
+
+    python3 -m bench.startup --repeat 5 --forks 8
+"""
+import argparse
+from bench.common import scratch_file, use_scratch_database
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+CHILD = '''
+import json, os, sys, time
+start = time.perf_counter()
+if sys.argv[1] == 'app':
+    from rel8.app import app
+import models
+from models.user import User
+imported = time.perf_counter()
+models.storage.count(User)
+timings = {'import': imported - start,
+           'first query': time.perf_counter() - imported}
+if sys.argv[1] == 'app':
+    started = time.perf_counter()
+    app.test_client().get('/metrics')
+    timings['first request'] = time.perf_counter() - started
+if sys.argv[1] == 'fork':
+    started = time.perf_counter()
+    children = []
+    for _ in range(int(sys.argv[2])):
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                models.storage.count(User)
+                models.storage.close()
+                status = 0
+            finally:
+                os._exit(status)
+        children.append(pid)
+    failed = sum(os.waitpid(pid, 0)[1] != 0 for pid in children)
+    models.storage.count(User)
+    timings['forked queries'] = time.perf_counter() - started
+    timings['failed children'] = failed
+print(json.dumps(timings))
+'''
+
+
+def run(target, mode, forks=0):
+    env = dict(os.environ, REL8_SCHEMA=mode)
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, target, str(forks)], env=env,
+        stdout=subprocess.PIPE, check=True).stdout
+    return json.loads(output.decode().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--forks', type=int, default=8)
+    args = parser.parse_args()
+
+    use_scratch_database(scratch_file('rel8-startup.db'))
+
+    print('{:>8} {:>8} {:>14} {:>10}'.format('', 'schema', '', 'median ms'))
+    for target in ('models', 'app'):
+        for mode in ('create', 'check'):
+            runs = [run(target, mode) for _ in range(args.repeat)]
+            for name in runs[0]:
+                print('{:>8} {:>8} {:>14} {:>10.1f}'.format(
+                    target, mode, name,
+                    statistics.median(r[name] for r in runs) * 1000))
+    if hasattr(os, 'fork'):
+        result = run('fork', 'check', args.forks)
+        print('{} forked children queried in {:.1f} ms, {} failed'.format(
+            args.forks, result['forked queries'] * 1000,
+            result['failed children']))
+
+
+if __name__ == '__main__':
+    main()
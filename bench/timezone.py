@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Benchmark of rendering UTC timestamps in a user's timezone
+
+Compares the per-row cost of the former get_local_dt, which looked the zone
+up and localized each datetime, with the cached batch functions of
+rel8.utils. No database is needed:
+
+    python3 -m bench.timezone --rows 100000
+"""
+import argparse
+from datetime import datetime, timedelta
+import time
+import pytz
+from pytz import timezone
+from rel8.utils import HUMAN_FORMAT, format_local_many, to_local_many
+
+
+def legacy(dts, tz_name, human):
+    out = []
+    for dt in dts:
+        tz = timezone(tz_name)
+        utc = timezone('UTC')
+        local_dt = utc.localize(dt, is_dst=None).astimezone(pytz.utc).astimezone(tz)
+        out.append(local_dt.strftime(HUMAN_FORMAT) if human else local_dt)
+    return out
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--timezone', default='US/Pacific')
+    args = parser.parse_args()
+
+    start = datetime(2018, 1, 1)
+    dts = [start + timedelta(minutes=37 * i) for i in range(args.rows)]
+
+    results = (
+        ('legacy datetime', timed(legacy, dts, args.timezone, False)),
+        ('to_local_many', timed(to_local_many, dts, args.timezone)),
+        ('legacy formatted', timed(legacy, dts, args.timezone, True)),
+        ('format_local_many', timed(format_local_many, dts, args.timezone)),
+    )
+    print('{:<20} {:>10} {:>12}'.format('', 'total s', 'us/row'))
+    for name, seconds in results:
+        print('{:<20} {:>10.3f} {:>12.2f}'.format(
+            name, seconds, seconds / args.rows * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4 @@
+-- Unique index on the E.164 phone number used by find_user_by_phone.
+-- New databases get it from create_all; apply this to existing ones.
+-- Duplicate phone numbers must be resolved before running it.
+CREATE UNIQUE INDEX ix_users_phone_number ON users (phone_number);
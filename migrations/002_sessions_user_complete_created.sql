@@ -0,0 +1,3 @@
+-- Composite index serving DBStorage.current_session on every SMS.
+CREATE INDEX ix_sessions_user_complete_created
+    ON sessions (user_id, complete, created_at);
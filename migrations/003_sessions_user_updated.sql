@@ -0,0 +1,2 @@
+-- Keyset index for the paginated dashboard.
+CREATE INDEX ix_sessions_user_updated ON sessions (user_id, updated_at, id);
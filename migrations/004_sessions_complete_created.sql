@@ -0,0 +1,2 @@
+-- Index driving the expired session sweep.
+CREATE INDEX ix_sessions_complete_created ON sessions (complete, created_at);
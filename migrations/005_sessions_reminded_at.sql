@@ -0,0 +1,4 @@
+-- Reminder bookkeeping and the index finding sessions due a reminder.
+ALTER TABLE sessions ADD COLUMN reminded_at DATETIME NULL;
+CREATE INDEX ix_sessions_complete_reminded_created
+    ON sessions (complete, reminded_at, created_at);
@@ -0,0 +1,6 @@
+-- Several predictors and outcomes per user, each with synonyms. Variables
+-- removed from /variables are deactivated so their responses keep a parent.
+ALTER TABLE predictors ADD COLUMN synonyms VARCHAR(255) NULL;
+ALTER TABLE predictors ADD COLUMN active BOOLEAN NOT NULL DEFAULT 1;
+ALTER TABLE outcomes ADD COLUMN synonyms VARCHAR(255) NULL;
+ALTER TABLE outcomes ADD COLUMN active BOOLEAN NOT NULL DEFAULT 1;
@@ -0,0 +1,2 @@
+-- Index joining responses to their sessions for the cohort analytics.
+CREATE INDEX ix_responses_session ON responses (session_id);
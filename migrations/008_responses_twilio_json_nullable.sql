@@ -0,0 +1,6 @@
+-- Webhook payloads now live compressed in response_payloads and the app no
+-- longer writes responses.twilio_json. Apply this before deploying that code:
+-- its inserts leave the column out, which fails while it is NOT NULL without
+-- a default. optional/drop_responses_twilio_json.sql drops the column once
+-- the payloads are archived.
+ALTER TABLE responses MODIFY twilio_json JSON NULL;
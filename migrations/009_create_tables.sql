@@ -0,0 +1,52 @@
+-- Tables added since 007: per-user association statistics, the enrollment
+-- state of unknown numbers (REL8_CONVERSATION_STORE=db), processed Twilio
+-- MessageSids and the compressed webhook payloads of responses.
+CREATE TABLE user_stats (
+    id VARCHAR(60) NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    user_id VARCHAR(60) NOT NULL,
+    paired INTEGER NOT NULL,
+    unpaired INTEGER NOT NULL,
+    lag_mean FLOAT NOT NULL,
+    lag_m2 FLOAT NOT NULL,
+    lag_histogram JSON NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (user_id),
+    FOREIGN KEY (user_id) REFERENCES users (id)
+);
+
+CREATE TABLE conversations (
+    id VARCHAR(60) NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    phone_number VARCHAR(60) NOT NULL,
+    state TEXT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_conversations_phone_number ON conversations (phone_number);
+CREATE INDEX ix_conversations_expires_at ON conversations (expires_at);
+
+CREATE TABLE processed_messages (
+    id VARCHAR(60) NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    message_sid VARCHAR(64) NOT NULL,
+    twiml TEXT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_processed_messages_message_sid ON processed_messages (message_sid);
+CREATE INDEX ix_processed_messages_expires_at ON processed_messages (expires_at);
+
+CREATE TABLE response_payloads (
+    id VARCHAR(60) NOT NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    response_id VARCHAR(60) NOT NULL,
+    payload BLOB NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY (response_id) REFERENCES responses (id)
+);
+CREATE UNIQUE INDEX ix_response_payloads_response_id ON response_payloads (response_id);
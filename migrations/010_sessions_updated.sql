@@ -0,0 +1,2 @@
+-- Keyset index of the export across every user.
+CREATE INDEX ix_sessions_updated ON sessions (updated_at, id);
@@ -0,0 +1,4 @@
+-- Records the schema version, read once per process by the app on first use
+-- (REL8_SCHEMA=check). Later migrations end by updating it.
+CREATE TABLE schema_version (version INTEGER NOT NULL);
+INSERT INTO schema_version (version) VALUES (11);
@@ -0,0 +1,48 @@
+-- Optional, MySQL only, not part of the numbered migrations. Apply it only
+-- when switching to REL8_ID_FORMAT=binary, after every numbered script: it
+-- converts every id and foreign key column from the UUID string to its 16
+-- bytes, which the app reads only in binary mode. Stop the app and back up
+-- the database first, ids already stored are kept, only their encoding changes.
+SET FOREIGN_KEY_CHECKS = 0;
+
+ALTER TABLE users MODIFY id VARBINARY(60) NOT NULL;
+UPDATE users SET id = UNHEX(REPLACE(id, '-', ''));
+ALTER TABLE users MODIFY id BINARY(16) NOT NULL;
+
+ALTER TABLE intervals MODIFY id VARBINARY(60) NOT NULL, MODIFY user_id VARBINARY(60) NOT NULL;
+UPDATE intervals SET id = UNHEX(REPLACE(id, '-', '')), user_id = UNHEX(REPLACE(user_id, '-', ''));
+ALTER TABLE intervals MODIFY id BINARY(16) NOT NULL, MODIFY user_id BINARY(16) NOT NULL;
+
+ALTER TABLE predictors MODIFY id VARBINARY(60) NOT NULL, MODIFY user_id VARBINARY(60) NOT NULL;
+UPDATE predictors SET id = UNHEX(REPLACE(id, '-', '')), user_id = UNHEX(REPLACE(user_id, '-', ''));
+ALTER TABLE predictors MODIFY id BINARY(16) NOT NULL, MODIFY user_id BINARY(16) NOT NULL;
+
+ALTER TABLE outcomes MODIFY id VARBINARY(60) NOT NULL, MODIFY user_id VARBINARY(60) NOT NULL;
+UPDATE outcomes SET id = UNHEX(REPLACE(id, '-', '')), user_id = UNHEX(REPLACE(user_id, '-', ''));
+ALTER TABLE outcomes MODIFY id BINARY(16) NOT NULL, MODIFY user_id BINARY(16) NOT NULL;
+
+ALTER TABLE sessions MODIFY id VARBINARY(60) NOT NULL, MODIFY user_id VARBINARY(60) NOT NULL, MODIFY interval_id VARBINARY(60) NOT NULL;
+UPDATE sessions SET id = UNHEX(REPLACE(id, '-', '')), user_id = UNHEX(REPLACE(user_id, '-', '')), interval_id = UNHEX(REPLACE(interval_id, '-', ''));
+ALTER TABLE sessions MODIFY id BINARY(16) NOT NULL, MODIFY user_id BINARY(16) NOT NULL, MODIFY interval_id BINARY(16) NOT NULL;
+
+ALTER TABLE responses MODIFY id VARBINARY(60) NOT NULL, MODIFY session_id VARBINARY(60) NOT NULL, MODIFY predictor_id VARBINARY(60) NULL, MODIFY outcome_id VARBINARY(60) NULL, MODIFY user_id VARBINARY(60) NOT NULL;
+UPDATE responses SET id = UNHEX(REPLACE(id, '-', '')), session_id = UNHEX(REPLACE(session_id, '-', '')), predictor_id = UNHEX(REPLACE(predictor_id, '-', '')), outcome_id = UNHEX(REPLACE(outcome_id, '-', '')), user_id = UNHEX(REPLACE(user_id, '-', ''));
+ALTER TABLE responses MODIFY id BINARY(16) NOT NULL, MODIFY session_id BINARY(16) NOT NULL, MODIFY predictor_id BINARY(16) NULL, MODIFY outcome_id BINARY(16) NULL, MODIFY user_id BINARY(16) NOT NULL;
+
+ALTER TABLE response_payloads MODIFY id VARBINARY(60) NOT NULL, MODIFY response_id VARBINARY(60) NOT NULL;
+UPDATE response_payloads SET id = UNHEX(REPLACE(id, '-', '')), response_id = UNHEX(REPLACE(response_id, '-', ''));
+ALTER TABLE response_payloads MODIFY id BINARY(16) NOT NULL, MODIFY response_id BINARY(16) NOT NULL;
+
+ALTER TABLE user_stats MODIFY id VARBINARY(60) NOT NULL, MODIFY user_id VARBINARY(60) NOT NULL;
+UPDATE user_stats SET id = UNHEX(REPLACE(id, '-', '')), user_id = UNHEX(REPLACE(user_id, '-', ''));
+ALTER TABLE user_stats MODIFY id BINARY(16) NOT NULL, MODIFY user_id BINARY(16) NOT NULL;
+
+ALTER TABLE conversations MODIFY id VARBINARY(60) NOT NULL;
+UPDATE conversations SET id = UNHEX(REPLACE(id, '-', ''));
+ALTER TABLE conversations MODIFY id BINARY(16) NOT NULL;
+
+ALTER TABLE processed_messages MODIFY id VARBINARY(60) NOT NULL;
+UPDATE processed_messages SET id = UNHEX(REPLACE(id, '-', ''));
+ALTER TABLE processed_messages MODIFY id BINARY(16) NOT NULL;
+
+SET FOREIGN_KEY_CHECKS = 1;
@@ -0,0 +1,5 @@
+-- Cleanup outside the numbered migrations, so it never changes schema_version:
+-- the app works with and without the column. Run it only after
+-- FLASK_APP=rel8.app flask archive-payloads has copied the existing payloads
+-- into response_payloads (see 008 and 009).
+ALTER TABLE responses DROP COLUMN twilio_json;
@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
 """Package initializer"""
+from models.conversation import Conversation
+from models.processed_message import ProcessedMessage
+from models.response_payload import ResponsePayload
 from models.user import User
 import os
 from models.engine.db_storage import DBStorage
@@ -7,4 +10,3 @@ from models.engine.db_storage import DBStorage
 
 storage = DBStorage()
 classes = {"User": User}
-storage.reload()
@@ -6,18 +6,74 @@ import uuid
 from datetime import datetime
 import models
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import BINARY, Column, Integer, String, DateTime
+from sqlalchemy.types import TypeDecorator
 import os
+import time
 
 
 Base = declarative_base()
 
+ID_FORMAT = os.getenv('REL8_ID_FORMAT', 'uuid4')
+if ID_FORMAT not in ('uuid4', 'uuid7', 'binary'):
+    raise ValueError('Unknown REL8_ID_FORMAT: {}'.format(ID_FORMAT))
+
+
+def uuid7():
+    """
+    Returns a UUID version 7: 48 bits of Unix time in milliseconds followed
+    by random bits, so ids created later sort after earlier ones
+    """
+    value = (int(time.time() * 1000) << 80) | int.from_bytes(
+        os.urandom(10), 'big')
+    value &= ~(0xf << 76)
+    value |= 0x7 << 76
+    value &= ~(0x3 << 62)
+    value |= 0x2 << 62
+    return uuid.UUID(int=value)
+
+
+def new_id():
+    """Returns a new id in the format selected by REL8_ID_FORMAT"""
+    if ID_FORMAT == 'uuid4':
+        return str(uuid.uuid4())
+    return str(uuid7())
+
+
+class IdType(TypeDecorator):
+    """
+    Id column type, always a UUID string on the Python side
+
+    Stored as String(60) unless REL8_ID_FORMAT is binary, then as the 16
+    raw bytes of the UUID. Strings that are not UUIDs are bound as their
+    bytes, so a malformed id in a URL matches nothing instead of failing.
+    """
+    impl = String(60)
+
+    def load_dialect_impl(self, dialect):
+        if ID_FORMAT == 'binary':
+            return dialect.type_descriptor(BINARY(16))
+        return dialect.type_descriptor(String(60))
+
+    def process_bind_param(self, value, dialect):
+        if ID_FORMAT != 'binary' or value is None or isinstance(value, bytes):
+            return value
+        try:
+            return uuid.UUID(value).bytes
+        except ValueError:
+            return value.encode('utf-8')
+
+    def process_result_value(self, value, dialect):
+        if ID_FORMAT != 'binary' or value is None:
+            return value
+        return str(uuid.UUID(bytes=value))
+
 
 class BaseModel:
     '''
         Base class for other classes to be used for the duration.
     '''
-    id = Column(String(60), nullable=False, primary_key=True)
+    id = Column(IdType, nullable=False, primary_key=True)
     created_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
 
@@ -26,7 +82,7 @@ class BaseModel:
             Initialize public instance attributes.
         '''
         if (len(kwargs) == 0):
-            self.id = str(uuid.uuid4())
+            self.id = new_id()
             self.created_at = datetime.now()
             self.updated_at = datetime.now()
         else:
@@ -44,7 +100,7 @@ class BaseModel:
                 if "__class__" not in key:
                     setattr(self, key, val)
             if not self.id:
-                self.id = str(uuid.uuid4())
+                self.id = new_id()
 
     def __str__(self):
         '''
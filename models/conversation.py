@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""Conversation module"""
+from datetime import datetime
+from models.base_model import Base, BaseModel, IdType
+from sqlalchemy import Column, DateTime, String, Text
+
+
+class Conversation(BaseModel, Base):
+    """Conversation class
+
+    SMS enrollment state of a phone number that is not a user yet.
+    """
+    __tablename__ = "conversations"
+    id = Column(IdType, nullable=False, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
+    phone_number = Column(String(60), nullable=False, unique=True, index=True)
+    state = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
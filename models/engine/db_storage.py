@@ -1,49 +1,303 @@
 #!/usr/bin/python3
 """DBStorage class that sets up SQLAlchemy and connects with database"""
+from datetime import datetime, timedelta
 import models
-from models.base_model import Base
+from models.base_model import Base, IdType, new_id
+from models.interval import Interval
+from models.outcome import Outcome
+from models.predictor import Predictor
+from models.response import Response
+from models.response_payload import pack_payload, ResponsePayload, unpack_payload
+from models.session import Session
 from models.user import User
+from models.user_stat import LAG_BUCKETS, UserStat
+import atexit
+import json
 import os
-from sqlalchemy import (create_engine)
-from sqlalchemy.orm import sessionmaker, scoped_session
+import shutil
+from sqlalchemy import and_, bindparam, column, Column, create_engine, event, func
+from sqlalchemy import Integer, or_, select, table, Table
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import selectinload, sessionmaker, scoped_session
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.orm.exc import MultipleResultsFound
+from sqlalchemy.pool import QueuePool
+import tempfile
+import threading
+import time
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool recording how long checkouts wait for a connection
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait = time.perf_counter() - start
+            with self.wait_lock:
+                self.checkouts += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+
+
+def database_url():
+    """
+    Returns the database URL selected by the environment
+
+    REL8_DATABASE_URL wins when set, otherwise REL8_DB_BACKEND picks
+    mysql (default, from the REL8_MYSQL_* variables) or sqlite (a file at
+    REL8_SQLITE_PATH, a temporary file of the process when unset or
+    ':memory:').
+    """
+    url = os.getenv("REL8_DATABASE_URL")
+    if url:
+        return url
+    if os.getenv("REL8_DB_BACKEND", "mysql") == "sqlite":
+        return 'sqlite:///{}'.format(os.getenv("REL8_SQLITE_PATH", ":memory:"))
+    return 'mysql+mysqldb://{}:{}@{}/{}'.format(
+        os.getenv("REL8_MYSQL_USER"), os.getenv("REL8_MYSQL_PWD"),
+        os.getenv("REL8_MYSQL_HOST"), os.getenv("REL8_MYSQL_DB"))
+
+
+def tune_sqlite(dbapi_connection, connection_record):
+    """
+    Connection hook applying the SQLite speed settings
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def scratch_sqlite_path():
+    """
+    Returns a SQLite file in a new temporary directory, removed when the
+    process that created it exits
+
+    It stands in for ':memory:': an in-memory database shared by the pool
+    needs SQLite's shared cache, whose table locks fail concurrent requests,
+    while a file gets WAL and the same concurrency as a configured path.
+    """
+    directory = tempfile.mkdtemp(prefix='rel8-')
+    pid = os.getpid()
+
+    def remove():
+        if os.getpid() == pid:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    atexit.register(remove)
+    return os.path.join(directory, 'rel8.db')
+
+
+def create_db_engine(url):
+    """
+    Creates the engine of a database URL with its pooling settings
+    An in-memory SQLite URL gets a temporary file of the current process.
+    """
+    pool_args = {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(os.getenv("REL8_POOL_SIZE", 5)),
+        'max_overflow': int(os.getenv("REL8_POOL_MAX_OVERFLOW", 10)),
+        'pool_timeout': int(os.getenv("REL8_POOL_TIMEOUT", 30))
+    }
+    if not url.startswith('sqlite'):
+        return create_engine(
+            url, pool_pre_ping=True,
+            pool_recycle=int(os.getenv("REL8_POOL_RECYCLE", 3600)),
+            **pool_args)
+
+    path = url.split(':///', 1)[1] if ':///' in url else ':memory:'
+    if path in ('', ':memory:'):
+        url = 'sqlite:///{}'.format(scratch_sqlite_path())
+    engine = create_engine(
+        url, connect_args={'check_same_thread': False, 'timeout': 30},
+        **pool_args)
+    event.listen(engine, 'connect', tune_sqlite)
+    return engine
+
+
+def insert_ignore(table):
+    """
+    Returns an INSERT into a table that skips rows colliding with a unique
+    key, so concurrent creators of the same row never fail on it
+    """
+    return table.insert().prefix_with(
+        'OR IGNORE', dialect='sqlite').prefix_with('IGNORE', dialect='mysql')
+
+
+def empty_stats(user_id, now):
+    """
+    Returns the column values of an empty user_stats row
+    """
+    return {'id': new_id(), 'created_at': now, 'updated_at': now,
+            'user_id': user_id, 'paired': 0, 'unpaired': 0, 'lag_mean': 0.0,
+            'lag_m2': 0.0, 'lag_histogram': [0] * (len(LAG_BUCKETS) + 1)}
+
+
+class SchemaVersionError(Exception):
+    """
+    Raised when the database schema is older than the code expects
+    """
+    pass
+
+
+SCHEMA_VERSION = 11
+schema_version = Table('schema_version', Base.metadata,
+                       Column('version', Integer, nullable=False))
+
+
+def schema_mode(url):
+    """
+    Returns what storage does with the schema on first use, from REL8_SCHEMA
+
+    create runs CREATE TABLE for whatever is missing, check only reads the
+    recorded schema version and skip does neither. SQLite defaults to create,
+    other databases to check.
+    """
+    default = 'create' if url.startswith('sqlite') else 'check'
+    return os.getenv("REL8_SCHEMA", default)
+
+
+def create_schema(engine):
+    """
+    Creates the missing tables of an engine and records the schema version
+    """
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(schema_version.delete())
+        conn.execute(schema_version.insert(), {'version': SCHEMA_VERSION})
+
+
+def prepare_schema(engine, mode):
+    """
+    Creates or checks the schema of an engine, in one query when checking
+    Raises:
+        SchemaVersionError: the schema is missing or at an older version
+    """
+    if mode == 'create':
+        create_schema(engine)
+        return
+    if mode != 'check':
+        return
+    try:
+        with engine.connect() as conn:
+            version = conn.execute(
+                select([func.max(schema_version.c.version)])).scalar()
+    except DBAPIError:
+        version = None
+    if version is None or version < SCHEMA_VERSION:
+        raise SchemaVersionError(
+            'database schema is at version {}, expected {}: run flask '
+            'create-schema on a new database or apply migrations/'.format(
+                version, SCHEMA_VERSION))
 
 
 class DBStorage:
     """
     DBStorage class
+
+    Nothing connects until the storage is first used. The engine and the
+    session registry then belong to the process that created them: a forked
+    child builds its own on first use instead of sharing the parent's sockets.
     """
     __engine = None
     __session = None
+    __pid = None
 
     def __init__(self):
         """
-        Initializes database connection
+        Initializes the storage, the database is connected on first use
         """
-        user_name = os.getenv("REL8_MYSQL_USER")
-        pwd = os.getenv("REL8_MYSQL_PWD")
-        host = os.getenv("REL8_MYSQL_HOST")
-        db = os.getenv("REL8_MYSQL_DB")
+        self.__lock = threading.Lock()
+        self.__hooks = []
+        self.__inherited = []
 
-        self.__engine = create_engine(
-            'mysql+mysqldb://{}:{}@{}/{}'.format(
-                user_name, pwd, host, db), pool_pre_ping=True)
+    @property
+    def engine(self):
+        """
+        SQLAlchemy engine of the storage, for event hooks and tooling
+        """
+        if self.__pid != os.getpid():
+            self.__bind()
+        return self.__engine
 
-        if os.getenv("HBNB_ENV") == 'test':
-            Base.metadata.drop_all(bind=self.__engine)
+    @property
+    def _session(self):
+        """
+        Session registry of the current process, every thread gets its own
+        session
+        """
+        if self.__pid != os.getpid():
+            self.__bind()
+        return self.__session
+
+    def on_engine(self, hook):
+        """
+        Calls hook with every engine the storage creates, once per process
+        Args:
+            hook (callable): takes the engine, e.g. to listen to its events
+        """
+        self.__hooks.append(hook)
+        if self.__pid == os.getpid():
+            hook(self.__engine)
 
-    def all(self, cls):
+    def __bind(self, mode=None):
+        """
+        Creates the engine and session registry of the current process and
+        prepares the schema as mode says, REL8_SCHEMA when None
+        """
+        with self.__lock:
+            if self.__pid == os.getpid():
+                return
+            if self.__engine is not None:
+                # connections inherited across a fork are the parent's, keep
+                # them referenced so they are never closed from this process
+                self.__inherited.append(self.__engine)
+            url = database_url()
+            engine = create_db_engine(url)
+            for hook in self.__hooks:
+                hook(engine)
+            try:
+                prepare_schema(engine, mode or schema_mode(url))
+            except Exception:
+                engine.dispose()
+                raise
+            self.__engine = engine
+            self.__session = scoped_session(sessionmaker(
+                bind=engine, expire_on_commit=False))
+            self.__pid = os.getpid()
+
+    def all(self, cls, stream=False, batch_size=1000):
         """
         Retrieves dictionary of objects in database
         Args:
             cls (obj): class of objects to be queried
+            stream (bool): return an iterator reading the table batch_size
+                           rows at a time instead of a dictionary of it all
+            batch_size (int): rows fetched per round-trip when streaming
         Returns:
-            dictionary of objects
+            dictionary of objects, or an iterator of them when streaming
         """
+        if stream:
+            return self._session.query(cls).execution_options(
+                stream_results=True).yield_per(batch_size)
+
         objs_dict = {}
         objs = None
 
-        objs = self.__session.query(cls).all()
+        objs = self._session.query(cls).all()
         for obj in objs:
             key = "{}.{}".format(type(obj).__name__, obj.id)
             objs_dict[key] = obj
@@ -54,38 +308,72 @@ class DBStorage:
         """
         Creates a query on current db session depending on class name
         """
-        self.__session.add(obj)
+        self._session.add(obj)
 
     def save(self):
         """
         commit all changes of the current db session
         """
-        self.__session.commit()
+        self._session.commit()
+
+    def rollback(self):
+        """
+        discard all changes of the current db session
+        """
+        self._session.rollback()
 
     def delete(self, obj=None):
         """
         delete from current db session obj if not none
         """
         if obj:
-            self.__session.delete(obj)
+            self._session.delete(obj)
             self.save()
 
-    def reload(self):
+    def discard(self, obj):
+        """
+        Deletes an object in the current transaction, committed by the caller
+        """
+        self._session.delete(obj)
+        self._session.flush()
+
+    def create_schema(self):
         """
-        create all tb in db
-        create current db session and is thread safe
+        Creates the missing tables and records the schema version, dropping
+        every table first when HBNB_ENV is test. Only ever called explicitly,
+        never by the first use of a process.
         """
-        Base.metadata.create_all(self.__engine)
-        session_factory = sessionmaker(bind=self.__engine,
-                                       expire_on_commit=False)
-        Session = scoped_session(session_factory)
-        self.__session = Session()
+        if self.__pid != os.getpid():
+            self.__bind('skip')
+        if os.getenv("HBNB_ENV") == 'test':
+            Base.metadata.drop_all(bind=self.__engine)
+        create_schema(self.__engine)
 
     def close(self):
         """
-            Remove private session attribute
+            Remove the session of the current thread, called on request
+            teardown so the next request starts with a fresh one
+        """
+        if self.__pid == os.getpid():
+            self.__session.remove()
+
+    def pool_status(self):
+        """
+            Returns the connection pool usage and checkout wait times
         """
-        self.__session.close()
+        pool = self.engine.pool
+        status = {
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'checked_in': pool.checkedin()
+        }
+        if isinstance(pool, TimedQueuePool):
+            with pool.wait_lock:
+                status['checkouts_total'] = pool.checkouts
+                status['wait_seconds_total'] = pool.wait_total
+                status['wait_seconds_max'] = pool.wait_max
+        return status
 
     def get(self, cls, id):
         """
@@ -97,12 +385,552 @@ class DBStorage:
                 object that matches query otherwise None
         """
         try:
-            return self.__session.query(cls).filter_by(id=id).one_or_none()
+            return self._session.query(cls).filter_by(id=id).one_or_none()
         except MultipleResultsFound:
             return None
 
-    def count(self, cls):
+    def get_by(self, cls, **kwargs):
+        """
+            Method to retrieve one object from db by column values
+            Args:
+                cls (cls): class to query
+                kwargs: column names and values to match, e.g. an
+                        indexed column such as phone_number
+            Returns:
+                object that matches query otherwise None
+        """
+        try:
+            return self._session.query(cls).filter_by(**kwargs).one_or_none()
+        except MultipleResultsFound:
+            return None
+
+    def current_session(self, user_id):
+        """
+            Retrieves the newest open session of a user
+            Args:
+                user_id (str): id of the user
+            Returns:
+                the open session created last, otherwise None
+        """
+        return self._session.query(Session).filter(
+            Session.user_id == user_id,
+            Session.complete == False
+        ).order_by(Session.created_at.desc()).first()
+
+    def closed_sessions(self, user_id):
+        """
+            Retrieves every closed session of a user with its responses
+            counted, in one query
+            Args:
+                user_id (str): id of the user
+            Returns:
+                list of (created_at, responses, last_response_at) rows in
+                the order the sessions opened
+        """
+        responses = Response.__table__
+        sessions = Session.__table__
+        return self._session.execute(select([
+            sessions.c.created_at, func.count(responses.c.id),
+            func.max(responses.c.created_at)
+        ]).select_from(sessions.outerjoin(
+            responses, responses.c.session_id == sessions.c.id
+        )).where(and_(
+            sessions.c.user_id == user_id,
+            sessions.c.complete == True
+        )).group_by(sessions.c.id, sessions.c.created_at).order_by(
+            sessions.c.created_at)).fetchall()
+
+    def close_session(self, session):
+        """
+            Marks an open session complete in the current transaction, with
+            an UPDATE conditional on it still being open so a session closed
+            concurrently by the sweeper is not counted again
+            Args:
+                session (Session): session to close
+            Returns:
+                True when this call closed it, False when it was already closed
+        """
+        sessions = Session.__table__
+        result = self._session.execute(sessions.update().where(and_(
+            sessions.c.id == session.id,
+            sessions.c.complete == False
+        )).values(complete=True))
+        set_committed_value(session, 'complete', True)
+        return result.rowcount == 1
+
+    def sessions_page(self, user_id, limit, before=None, after=None):
+        """
+            Retrieves one page of a user's sessions with their responses
+            Pages are keyed on (updated_at, id) so any page costs the same
+            two queries: one for the sessions, one for their responses.
+            Args:
+                user_id (str): id of the user
+                limit (int): maximum number of sessions on the page
+                before (tuple): (updated_at, id) of the session the page
+                                ends before, defaults to the newest page
+                after (tuple): (updated_at, id) of the session the page
+                               starts after
+            Returns:
+                tuple of the sessions, oldest first, and whether more
+                sessions exist beyond the page in the paging direction
+        """
+        query = self._session.query(Session).filter(
+            Session.user_id == user_id
+        ).options(selectinload(Session.responses))
+        if after:
+            updated_at, id = after
+            query = query.filter(or_(
+                Session.updated_at > updated_at,
+                and_(Session.updated_at == updated_at, Session.id > id)
+            )).order_by(Session.updated_at, Session.id)
+        else:
+            if before:
+                updated_at, id = before
+                query = query.filter(or_(
+                    Session.updated_at < updated_at,
+                    and_(Session.updated_at == updated_at, Session.id < id)
+                ))
+            query = query.order_by(Session.updated_at.desc(),
+                                   Session.id.desc())
+        sessions = query.limit(limit + 1).all()
+        more = len(sessions) > limit
+        sessions = sessions[:limit]
+        if not after:
+            sessions.reverse()
+        return sessions, more
+
+    def iter_session_responses(self, user_id, batch_size=1000):
+        """
+            Streams a user's responses joined with their sessions
+            Rows are ordered by the database by session then response time
+            and read through a server-side cursor batch_size at a time.
+            Args:
+                user_id (str): id of the user
+                batch_size (int): rows fetched per round-trip
+            Returns:
+                iterator of (session_id, updated_at, message) rows
+        """
+        query = self._session.query(
+            Session.id, Response.updated_at, Response.message
+        ).join(
+            Response, Response.session_id == Session.id
+        ).filter(
+            Session.user_id == user_id
+        ).order_by(Session.updated_at, Session.id, Response.updated_at)
+        return query.execution_options(
+            stream_results=True).yield_per(batch_size)
+
+    def iter_cohort_sessions(self, predictor=None, outcome=None,
+                             batch_size=10000):
+        """
+            Streams every closed session of every user in chunks, with the
+            predictor that opened it and the outcome that paired it
+            Runs on its own connection through a server-side cursor.
+            Args:
+                predictor (str): only sessions opened by a predictor of
+                                 this name
+                outcome (str): only users tracking an outcome of this name,
+                               sessions paired with another one are left out
+                batch_size (int): rows per chunk
+            Returns:
+                generator of lists of (user_id, predictor, opened_at,
+                outcome, paired_at) rows, outcome and paired_at None when
+                the session expired unpaired
+        """
+        sessions = Session.__table__
+        predictors = Predictor.__table__
+        outcomes = Outcome.__table__
+        opened = Response.__table__.alias('opened')
+        paired = Response.__table__.alias('paired')
+        tracked = outcomes.alias('tracked')
+        query = select([
+            sessions.c.user_id, predictors.c.name, sessions.c.created_at,
+            outcomes.c.name, paired.c.created_at
+        ]).select_from(
+            sessions.join(opened, and_(opened.c.session_id == sessions.c.id,
+                                       opened.c.predictor_id != None))
+            .join(predictors, predictors.c.id == opened.c.predictor_id)
+            .outerjoin(paired, and_(paired.c.session_id == sessions.c.id,
+                                    paired.c.outcome_id != None))
+            .outerjoin(outcomes, outcomes.c.id == paired.c.outcome_id)
+        ).where(sessions.c.complete == True)
+        if predictor is not None:
+            query = query.where(predictors.c.name == predictor)
+        if outcome is not None:
+            query = query.where(and_(
+                sessions.c.user_id.in_(select([tracked.c.user_id]).where(
+                    tracked.c.name == outcome)),
+                or_(outcomes.c.name == outcome, outcomes.c.name == None)))
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(query)
+            while True:
+                rows = result.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    def iter_export(self, user_id=None, after=None, batch_size=1000):
+        """
+            Streams sessions with their responses as column tuples, ordered
+            by (updated_at, id) so an export can resume after any session
+            Runs on its own connection, two queries per batch.
+            Args:
+                user_id (str): only this user's sessions, every user's
+                               when None
+                after (tuple): (updated_at, id) of the last session already
+                               exported
+                batch_size (int): sessions per batch
+            Returns:
+                generator of (sessions, responses) lists of rows, with the
+                columns of Session.__table__ and Response.__table__
+        """
+        sessions = Session.__table__
+        responses = Response.__table__
+        page = select(list(sessions.columns)).order_by(
+            sessions.c.updated_at, sessions.c.id).limit(batch_size)
+        if user_id is not None:
+            page = page.where(sessions.c.user_id == user_id)
+        children = select(list(responses.columns)).where(
+            responses.c.session_id.in_(bindparam('ids', expanding=True))
+        ).order_by(responses.c.session_id, responses.c.created_at)
+        with self.engine.connect() as conn:
+            while True:
+                query = page
+                if after:
+                    updated_at, id = after
+                    query = page.where(or_(
+                        sessions.c.updated_at > updated_at,
+                        and_(sessions.c.updated_at == updated_at,
+                             sessions.c.id > id)))
+                rows = conn.execute(query).fetchall()
+                if not rows:
+                    break
+                yield rows, conn.execute(
+                    children, ids=[row.id for row in rows]).fetchall()
+                if len(rows) < batch_size:
+                    break
+                after = (rows[-1].updated_at, rows[-1].id)
+
+    def get_stats(self, user_id, for_update=False):
+        """
+            Retrieves the statistics of a user
+            A missing row is returned empty and unsaved to readers. With
+            for_update it is created in the current transaction, committed
+            by the caller, without conflicting with a concurrent creation.
+            Args:
+                user_id (str): id of the user
+                for_update (bool): lock the row until the next commit so
+                                   concurrent updates do not overwrite it
+            Returns:
+                UserStat of the user
+        """
+        query = self._session.query(UserStat).filter_by(user_id=user_id)
+        if for_update:
+            query = query.with_for_update()
+        stat = query.one_or_none()
+        if stat is None and for_update:
+            # a concurrent first update may be creating the row too: insert
+            # unless it exists, then lock whichever row won
+            self._session.execute(insert_ignore(UserStat.__table__),
+                                  [empty_stats(user_id, datetime.utcnow())])
+            stat = query.one()
+        elif stat is None:
+            stat = UserStat(user_id=user_id)
+            stat.reset()
+        return stat
+
+    def close_expired_sessions(self, now=None):
+        """
+            Marks complete every open session past its interval duration
+            Sessions are closed one interval duration at a time, so each
+            cutoff is a plain created_at bound served by the
+            (complete, created_at) index, with one transaction per duration:
+            a grouped count of the expired sessions per user, read under
+            the write lock (FOR UPDATE on MySQL, the SQLite write lock taken
+            by creating missing stats rows), one UPDATE closing them all and
+            one UPDATE adding each user's count to unpaired. A concurrent
+            sweep waits for the lock and then finds those sessions closed,
+            so none is counted twice.
+            Runs on its own connection and is safe to call from any thread.
+            Args:
+                now (datetime): UTC time to expire against, defaults to now
+            Returns:
+                number of sessions closed
+        """
+        now = now or datetime.utcnow()
+        sessions = Session.__table__
+        stats = UserStat.__table__
+        count_unpaired = stats.update().where(
+            stats.c.user_id == bindparam('b_user_id')
+        ).values(unpaired=stats.c.unpaired + bindparam('b_count'))
+        closed = 0
+        with self.engine.connect() as conn:
+            durations = [row[0] for row in conn.execute(
+                select([Interval.__table__.c.duration]).distinct())]
+            for duration in durations:
+                expired = and_(
+                    sessions.c.complete == False,
+                    sessions.c.created_at < now - timedelta(hours=duration),
+                    sessions.c.interval_id.in_(
+                        select([Interval.__table__.c.id]).where(
+                            Interval.__table__.c.duration == duration))
+                )
+                user_ids = [row[0] for row in conn.execute(
+                    select([sessions.c.user_id]).where(expired).distinct())]
+                if not user_ids:
+                    continue
+                with conn.begin():
+                    conn.execute(insert_ignore(stats), [
+                        empty_stats(user_id, now) for user_id in user_ids])
+                    counts = conn.execute(
+                        select([sessions.c.user_id, func.count()])
+                        .where(expired).group_by(sessions.c.user_id)
+                        .with_for_update()).fetchall()
+                    if not counts:
+                        continue
+                    conn.execute(sessions.update().where(expired)
+                                 .values(complete=True))
+                    conn.execute(count_unpaired, [
+                        {'b_user_id': user_id, 'b_count': count}
+                        for user_id, count in sorted(counts)])
+                    closed += sum(count for user_id, count in counts)
+        return closed
+
+    def claim_reminders(self, lead, now=None, batch_size=1000):
+        """
+            Yields batches of open sessions expiring within lead, each batch
+            marked reminded before it is yielded so it is sent at most once
+            Each session is claimed by its own conditional UPDATE and only
+            those this call claimed are yielded, so concurrent senders never
+            get the same session.
+            Like close_expired_sessions, each interval duration turns into a
+            created_at range served by the (complete, reminded_at,
+            created_at) index. Runs on its own connection.
+            Args:
+                lead (timedelta): how long before expiry a session is due
+                now (datetime): UTC time to compare against, defaults to now
+                batch_size (int): sessions claimed per transaction
+            Returns:
+                generator of lists of (session_id, phone_number, outcome,
+                duration) rows
+        """
+        now = now or datetime.utcnow()
+        sessions = Session.__table__
+        intervals = Interval.__table__
+        claim = sessions.update().where(and_(
+            sessions.c.id == bindparam('b_id'),
+            sessions.c.reminded_at == None
+        )).values(reminded_at=now)
+        with self.engine.connect() as conn:
+            durations = [row[0] for row in conn.execute(
+                select([intervals.c.duration]).distinct())]
+            for duration in durations:
+                expires = now - timedelta(hours=duration)
+                due = select([
+                    sessions.c.id, User.__table__.c.phone_number,
+                    func.min(Outcome.__table__.c.name)
+                ]).select_from(
+                    sessions.join(User.__table__,
+                                  User.__table__.c.id == sessions.c.user_id)
+                    .join(Outcome.__table__, and_(
+                        Outcome.__table__.c.user_id == sessions.c.user_id,
+                        Outcome.__table__.c.active == True))
+                ).where(and_(
+                    sessions.c.complete == False,
+                    sessions.c.reminded_at == None,
+                    sessions.c.created_at >= expires,
+                    sessions.c.created_at < expires + lead,
+                    sessions.c.interval_id.in_(
+                        select([intervals.c.id]).where(
+                            intervals.c.duration == duration))
+                )).group_by(
+                    sessions.c.id, User.__table__.c.phone_number
+                ).limit(batch_size)
+                while True:
+                    rows = conn.execute(due).fetchall()
+                    if not rows:
+                        break
+                    claimed = []
+                    with conn.begin():
+                        for row in rows:
+                            if conn.execute(claim, b_id=row[0]).rowcount == 1:
+                                claimed.append(tuple(row) + (duration,))
+                    if claimed:
+                        yield claimed
+                    if len(rows) < batch_size:
+                        break
+
+    def release_reminders(self, session_ids):
+        """
+            Clears the reminder claim of sessions whose reminder could not
+            be sent, so the next claim_reminders picks them up again while
+            they are still open. Runs in a transaction of its own.
+            Args:
+                session_ids (list): ids of the sessions to release
+            Returns:
+                number of sessions released
+        """
+        if not session_ids:
+            return 0
+        sessions = Session.__table__
+        with self.engine.begin() as conn:
+            return conn.execute(sessions.update().where(and_(
+                sessions.c.id.in_(session_ids),
+                sessions.c.complete == False
+            )).values(reminded_at=None)).rowcount
+
+    def purge(self, cls, before, column='expires_at', in_session=False):
+        """
+            Deletes every row whose column is older than a time
+            Args:
+                cls (cls): class whose table is purged
+                before (datetime): rows strictly older are deleted
+                column (str): datetime column to compare
+                in_session (bool): delete in the current transaction,
+                                   committed by the caller, instead of in
+                                   a transaction of its own
+            Returns:
+                number of rows deleted
+        """
+        table = cls.__table__
+        delete = table.delete().where(table.c[column] < before)
+        if in_session:
+            return self._session.execute(delete).rowcount
+        with self.engine.begin() as conn:
+            return conn.execute(delete).rowcount
+
+    def upsert(self, cls, key, values):
+        """
+            Inserts the row of a class matching a unique column or updates
+            it when it exists, in the current transaction without committing
+            Args:
+                cls (cls): class whose table receives the row
+                key (dict): unique column and its value
+                values (dict): other column values to set
+        """
+        table = cls.__table__
+        now = datetime.utcnow()
+        self._session.execute(insert_ignore(table), [dict(
+            values, id=new_id(), created_at=now, updated_at=now, **key)])
+        self._session.execute(table.update().where(and_(
+            *[table.c[name] == value for name, value in key.items()]
+        )).values(updated_at=now, **values))
+
+    def bulk_insert(self, cls, mappings):
+        """
+            Inserts many rows of a class without building objects
+            Args:
+                cls (cls): class whose table receives the rows
+                mappings (list): dictionaries of column values
+        """
+        self._session.bulk_insert_mappings(cls, mappings)
+
+    def archive_payload(self, response_id, payload):
+        """
+            Stages the compressed webhook payload of a response
+            Args:
+                response_id (str): id of the response
+                payload (dict): webhook form fields, nothing is stored
+                                when empty
+        """
+        if payload:
+            self.new(ResponsePayload(response_id=response_id,
+                                     payload=pack_payload(payload)))
+
+    def get_payload(self, response_id):
+        """
+            Loads the webhook payload of a response
+            Args:
+                response_id (str): id of the response
+            Returns:
+                payload dictionary or None if none was stored
+        """
+        data = self._session.query(ResponsePayload.payload).filter(
+            ResponsePayload.response_id == response_id).scalar()
+        return unpack_payload(data) if data is not None else None
+
+    def archive_legacy_payloads(self, batch_size=1000):
+        """
+            Copies payloads still held in responses.twilio_json into
+            response_payloads, compressed, skipping empty ones and those
+            already archived. Walks responses by id, one transaction per
+            batch, so it can be stopped and run again.
+            Args:
+                batch_size (int): responses read per batch
+            Returns:
+                number of payloads archived
+        """
+        legacy = table('responses', column('id', IdType),
+                       column('twilio_json'))
+        payloads = ResponsePayload.__table__
+        archived = 0
+        last_id = None
+        with self.engine.connect() as conn:
+            while True:
+                query = select([legacy.c.id, legacy.c.twilio_json])
+                if last_id is not None:
+                    query = query.where(legacy.c.id > last_id)
+                rows = conn.execute(
+                    query.order_by(legacy.c.id).limit(batch_size)).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                done = set(row[0] for row in conn.execute(
+                    select([payloads.c.response_id]).where(
+                        payloads.c.response_id.in_([row[0] for row in rows]))))
+                now = datetime.utcnow()
+                mappings = []
+                for id, raw in rows:
+                    payload = json.loads(raw) if raw else None
+                    if id in done or not isinstance(payload, dict) or not payload:
+                        continue
+                    mappings.append({
+                        'id': new_id(), 'created_at': now,
+                        'updated_at': now, 'response_id': id,
+                        'payload': pack_payload(payload)})
+                if mappings:
+                    with conn.begin():
+                        conn.execute(payloads.insert(), mappings)
+                    archived += len(mappings)
+        return archived
+
+    def count(self, cls, **filters):
         """
             Returns the number of objects in storage matching the given class
+            Args:
+                cls (cls): class to count
+                filters: column names and values the rows must match
+        """
+        return self._session.query(func.count(cls.id)).filter(
+            *self.__criteria(cls, filters)).scalar()
+
+    def exists(self, cls, **filters):
+        """
+            Returns True if any object of the given class matches filters
+        """
+        query = self._session.query(cls).filter(
+            *self.__criteria(cls, filters))
+        return self._session.query(query.exists()).scalar()
+
+    def get_many(self, cls, ids, chunk_size=500):
+        """
+            Method to retrieve many objects from db by id
+            Args:
+                cls (cls): class to query
+                ids (iterable): ids of the objects
+                chunk_size (int): ids sent per IN query
+            Returns:
+                list of the objects found, in no particular order
+        """
+        ids = list(ids)
+        objs = []
+        for i in range(0, len(ids), chunk_size):
+            objs.extend(self._session.query(cls).filter(
+                cls.id.in_(ids[i:i + chunk_size])).all())
+        return objs
+
+    def __criteria(self, cls, filters):
+        """
+            Turns keyword filters into column comparisons
         """
-        return len(models.storage.all(cls).values())
+        return [getattr(cls, key) == value for key, value in filters.items()]
@@ -1,19 +1,26 @@
 #!/usr/bin/env python3
 """Predictor module"""
 from datetime import datetime
-from models.base_model import Base, BaseModel
+from models.base_model import Base, BaseModel, IdType
 from models.response import Response
-from sqlalchemy import Column, DateTime, ForeignKey, String
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, String
 from sqlalchemy.orm import relationship
 
 
 class Predictor(BaseModel, Base):
     """Predictor class"""
     __tablename__ = "predictors"
-    id = Column(String(60), nullable=False, primary_key=True)
+    id = Column(IdType, nullable=False, primary_key=True)
     created_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
     name = Column(String(60), nullable=False)
-    user_id = Column(String(60), ForeignKey('users.id'), nullable=False)
-    user = relationship('User', back_populates='predictor')
+    synonyms = Column(String(255), nullable=True)
+    active = Column(Boolean, nullable=False, default=True)
+    user_id = Column(IdType, ForeignKey('users.id'), nullable=False)
+    user = relationship('User', back_populates='predictors')
     responses = relationship('Response', back_populates='predictor')
+
+    def keywords(self):
+        """Returns the name followed by the comma separated synonyms"""
+        return [self.name] + [word.strip() for word in
+                              (self.synonyms or '').split(',') if word.strip()]
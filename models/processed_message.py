@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""ProcessedMessage module"""
+from datetime import datetime
+from models.base_model import Base, BaseModel, IdType
+from sqlalchemy import Column, DateTime, String, Text
+
+
+class ProcessedMessage(BaseModel, Base):
+    """ProcessedMessage class
+
+    Twilio MessageSid of an inbound SMS already handled, with the TwiML
+    replied so a webhook retry gets the same answer.
+    """
+    __tablename__ = "processed_messages"
+    id = Column(IdType, nullable=False, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
+    message_sid = Column(String(64), nullable=False, unique=True, index=True)
+    twiml = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
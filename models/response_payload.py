@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""ResponsePayload module"""
+from datetime import datetime
+import json
+from models.base_model import Base, BaseModel, IdType
+from sqlalchemy import Column, DateTime, ForeignKey, LargeBinary
+from sqlalchemy.orm import relationship
+import zlib
+
+
+# Field names and values every Twilio SMS webhook repeats, given to zlib as a
+# preset dictionary so even a single small payload compresses well. Changing
+# it makes existing rows unreadable, add a new format version instead.
+PAYLOAD_ZDICT = (
+    b'{"AccountSid": "AC", "ApiVersion": "2010-04-01", "Body": "", '
+    b'"From": "+1", "FromCity": "", "FromCountry": "US", "FromState": "", '
+    b'"FromZip": "", "MessageSid": "SM", "MessagingServiceSid": "MG", '
+    b'"NumMedia": "0", "NumSegments": "1", "SmsMessageSid": "SM", '
+    b'"SmsSid": "SM", "SmsStatus": "received", "To": "+1", "ToCity": "", '
+    b'"ToCountry": "US", "ToState": "", "ToZip": ""}'
+)
+FORMAT_ZDICT = b'\x01'
+
+
+def pack_payload(payload):
+    """Returns a webhook payload dictionary as compressed bytes"""
+    compressor = zlib.compressobj(level=9, zdict=PAYLOAD_ZDICT)
+    data = json.dumps(payload, sort_keys=True).encode('utf-8')
+    return FORMAT_ZDICT + compressor.compress(data) + compressor.flush()
+
+
+def unpack_payload(data):
+    """Returns the payload dictionary stored by pack_payload"""
+    if data[:1] != FORMAT_ZDICT:
+        raise ValueError('Unknown payload format {!r}'.format(data[:1]))
+    decompressor = zlib.decompressobj(zdict=PAYLOAD_ZDICT)
+    return json.loads(decompressor.decompress(data[1:]).decode('utf-8'))
+
+
+class ResponsePayload(BaseModel, Base):
+    """ResponsePayload class
+
+    Compressed webhook payload of a response, kept out of the responses
+    table so scans of texts never read it.
+    """
+    __tablename__ = "response_payloads"
+    id = Column(IdType, nullable=False, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
+    response_id = Column(IdType, ForeignKey('responses.id'),
+                         nullable=False, unique=True, index=True)
+    response = relationship('Response')
+    payload = Column(LargeBinary, nullable=False)
+
+    def data(self):
+        """Returns the decompressed payload dictionary"""
+        return unpack_payload(self.payload)
@@ -1,21 +1,31 @@
 #!/usr/bin/env python3
 """Session module"""
 from datetime import datetime
-from models.base_model import Base, BaseModel
+from models.base_model import Base, BaseModel, IdType
 from models.response import Response
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, String
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 
 class Session(BaseModel, Base):
     """Session class"""
     __tablename__ = "sessions"
-    id = Column(String(60), nullable=False, primary_key=True)
+    __table_args__ = (
+        Index('ix_sessions_user_complete_created',
+              'user_id', 'complete', 'created_at'),
+        Index('ix_sessions_user_updated', 'user_id', 'updated_at', 'id'),
+        Index('ix_sessions_updated', 'updated_at', 'id'),
+        Index('ix_sessions_complete_created', 'complete', 'created_at'),
+        Index('ix_sessions_complete_reminded_created',
+              'complete', 'reminded_at', 'created_at'),
+    )
+    id = Column(IdType, nullable=False, primary_key=True)
     created_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
-    user_id = Column(String(60), ForeignKey('users.id'), nullable=False)
+    user_id = Column(IdType, ForeignKey('users.id'), nullable=False)
     user = relationship('User', back_populates='sessions')
-    interval_id = Column(String(60), ForeignKey('intervals.id'), nullable=False)
+    interval_id = Column(IdType, ForeignKey('intervals.id'), nullable=False)
     interval = relationship('Interval', back_populates='sessions')
     responses = relationship('Response', back_populates='session')
     complete = Column(Boolean, default=False)
+    reminded_at = Column(DateTime, nullable=True)
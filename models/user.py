@@ -2,12 +2,13 @@
 """User module"""
 from datetime import datetime
 from flask_login import UserMixin
-from models.base_model import Base, BaseModel
+from models.base_model import Base, BaseModel, IdType
 from models.interval import Interval
 from models.outcome import Outcome
 from models.predictor import Predictor
 from models.response import Response
 from models.session import Session
+from models.user_stat import UserStat
 from sqlalchemy import Column, DateTime, String
 from sqlalchemy.orm import relationship
 
@@ -15,16 +16,29 @@ from sqlalchemy.orm import relationship
 class User(UserMixin, BaseModel, Base):
     """User class"""
     __tablename__ = "users"
-    id = Column(String(60), nullable=False, primary_key=True)
+    id = Column(IdType, nullable=False, primary_key=True)
     created_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
     username = Column(String(60), nullable=False)
     access_code = Column(String(60), nullable=False)
-    phone_number = Column(String(60), nullable=False)
+    phone_number = Column(String(60), nullable=False, unique=True, index=True)
     password = Column(String(128), nullable=True)
     timezone = Column(String(60), nullable=True)
     interval = relationship('Interval', uselist=False, back_populates='user')
-    predictor = relationship('Predictor', uselist=False, back_populates='user')
-    outcome = relationship('Outcome', uselist=False, back_populates='user')
+    predictors = relationship('Predictor', back_populates='user',
+                              order_by='Predictor.created_at')
+    outcomes = relationship('Outcome', back_populates='user',
+                            order_by='Outcome.created_at')
     sessions = relationship('Session', back_populates='user')
     responses = relationship('Response', back_populates='user')
+    stat = relationship('UserStat', uselist=False, back_populates='user')
+
+    @property
+    def predictor(self):
+        """First active predictor, None until variables are set up"""
+        return next((p for p in self.predictors if p.active), None)
+
+    @property
+    def outcome(self):
+        """First active outcome, None until variables are set up"""
+        return next((o for o in self.outcomes if o.active), None)
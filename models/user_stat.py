@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""UserStat module"""
+from datetime import datetime
+import math
+from models.base_model import Base, BaseModel, IdType
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, JSON
+from sqlalchemy.orm import relationship
+
+
+LAG_BUCKETS = (15, 30, 60, 120, 240, 480, 720, 1440)
+
+
+def lag_bucket(lag):
+    """Returns the histogram bucket of a lag in minutes"""
+    for i, upper in enumerate(LAG_BUCKETS):
+        if lag < upper:
+            return i
+    return len(LAG_BUCKETS)
+
+
+def bucket_labels():
+    """Returns the label of every histogram bucket"""
+    labels = []
+    lower = 0
+    for upper in LAG_BUCKETS:
+        labels.append('{}-{} min'.format(lower, upper))
+        lower = upper
+    labels.append('{}+ min'.format(lower))
+    return labels
+
+
+class UserStat(BaseModel, Base):
+    """UserStat class
+
+    Running association statistics of a user, updated as sessions close.
+    The lag mean and variance use Welford's streaming update and the lag
+    histogram counts paired sessions per LAG_BUCKETS range.
+    """
+    __tablename__ = "user_stats"
+    id = Column(IdType, nullable=False, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow(), nullable=False)
+    user_id = Column(IdType, ForeignKey('users.id'), nullable=False, unique=True)
+    user = relationship('User', back_populates='stat')
+    paired = Column(Integer, nullable=False, default=0)
+    unpaired = Column(Integer, nullable=False, default=0)
+    lag_mean = Column(Float, nullable=False, default=0.0)
+    lag_m2 = Column(Float, nullable=False, default=0.0)
+    lag_histogram = Column(JSON, nullable=False,
+                           default=lambda: [0] * (len(LAG_BUCKETS) + 1))
+
+    def reset(self):
+        """Clears every statistic"""
+        self.paired = 0
+        self.unpaired = 0
+        self.lag_mean = 0.0
+        self.lag_m2 = 0.0
+        self.lag_histogram = [0] * (len(LAG_BUCKETS) + 1)
+
+    def record_pair(self, lag):
+        """Counts a session closed by an outcome lag minutes after it opened"""
+        self.paired += 1
+        delta = lag - self.lag_mean
+        self.lag_mean += delta / self.paired
+        self.lag_m2 += delta * (lag - self.lag_mean)
+        histogram = list(self.lag_histogram)
+        histogram[lag_bucket(lag)] += 1
+        self.lag_histogram = histogram
+
+    def record_unpaired(self, count=1):
+        """Counts sessions that expired without an outcome"""
+        self.unpaired += count
+
+    def merge(self, other):
+        """Adds the statistics of another UserStat, as if its sessions had
+        been recorded here, with the parallel form of Welford's update"""
+        paired = self.paired + other.paired
+        if other.paired:
+            delta = other.lag_mean - self.lag_mean
+            self.lag_m2 += other.lag_m2 + delta ** 2 * self.paired * other.paired / paired
+            self.lag_mean += delta * other.paired / paired
+        self.paired = paired
+        self.unpaired += other.unpaired
+        self.lag_histogram = [mine + theirs for mine, theirs in
+                              zip(self.lag_histogram, other.lag_histogram)]
+
+    @property
+    def lag_variance(self):
+        if self.paired < 2:
+            return 0.0
+        return self.lag_m2 / (self.paired - 1)
+
+    @property
+    def lag_stdev(self):
+        return math.sqrt(self.lag_variance)
+
+    @property
+    def pairing_rate(self):
+        total = self.paired + self.unpaired
+        if total == 0:
+            return 0.0
+        return self.paired / total
+
+    def histogram(self):
+        """Returns (label, count) pairs of the lag histogram"""
+        return list(zip(bucket_labels(), self.lag_histogram))
+
+    def summary(self):
+        """Returns the statistics as a JSON serializable dictionary"""
+        return {
+            'paired': self.paired,
+            'unpaired': self.unpaired,
+            'pairing_rate': self.pairing_rate,
+            'lag_mean': self.lag_mean,
+            'lag_stdev': self.lag_stdev,
+            'lag_histogram': [
+                {'bucket': label, 'count': count}
+                for label, count in self.histogram()
+            ]
+        }
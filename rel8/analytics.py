@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Cohort analytics module
+
+Aggregates the closed sessions of every user, optionally narrowed to one
+predictor and outcome keyword. Sessions are streamed from storage in chunks
+and each chunk is turned into NumPy columns and folded into running
+aggregates, so memory depends on the chunk size and the number of distinct
+keywords, never on the size of the history.
+
+Results only ever leave through the cohort-stats command and only describe
+groups of at least min_users users: smaller groups, and the keywords only
+they use, are left out.
+"""
+import numpy as np
+from models.user_stat import bucket_labels, LAG_BUCKETS
+
+
+QUANTILES = (0.25, 0.5, 0.75, 0.9, 0.99)
+MAX_LAG_MINUTES = 7 * 24 * 60
+MIN_COHORT_USERS = 10
+
+
+class CohortAnalysis:
+    """
+    Running lag and pairing aggregates over chunks of cohort sessions
+
+    Lags are also counted in one minute bins up to max_lag minutes, from
+    which quantiles are read to the minute without keeping every lag.
+    """
+    def __init__(self, max_lag=MAX_LAG_MINUTES):
+        """
+        Args:
+            max_lag (int): minutes covered by the quantile bins, longer lags
+                           all count in a last overflow bin
+        """
+        self.max_lag = max_lag
+        self.minutes = np.zeros(max_lag + 2, dtype=np.int64)
+        self.histogram = np.zeros(len(LAG_BUCKETS) + 1, dtype=np.int64)
+        self.sessions = 0
+        self.paired = 0
+        self.lag_sum = 0.0
+        self.lag_squares = 0.0
+        self.users = set()
+        self.predictors = {}
+        self.pairs = {}
+        self.predictor_users = {}
+        self.pair_users = {}
+
+    def add(self, rows):
+        """
+        Folds a chunk of (user_id, predictor, opened_at, outcome, paired_at)
+        rows into the aggregates
+        """
+        if not rows:
+            return
+        user_ids, predictors, opened_at, outcomes, paired_at = (
+            np.array(column, dtype=object) for column in zip(*rows))
+        is_paired = paired_at != None
+        lags = (paired_at[is_paired].astype('datetime64[s]') -
+                opened_at[is_paired].astype('datetime64[s]')
+                ).astype(np.float64) / 60
+        lags = np.maximum(lags, 0)
+
+        self.sessions += len(rows)
+        self.paired += int(is_paired.sum())
+        self.lag_sum += float(lags.sum())
+        self.lag_squares += float(np.square(lags).sum())
+        self.users.update(np.unique(user_ids).tolist())
+        self.minutes += np.bincount(
+            np.minimum(lags.astype(np.int64), self.max_lag + 1),
+            minlength=len(self.minutes))
+        self.histogram += np.bincount(
+            np.searchsorted(LAG_BUCKETS, lags, side='right'),
+            minlength=len(self.histogram))
+
+        names, inverse = np.unique(predictors, return_inverse=True)
+        sessions = np.bincount(inverse, minlength=len(names))
+        paired = np.bincount(inverse, weights=is_paired, minlength=len(names))
+        for name, count, paired_count in zip(names, sessions, paired):
+            totals = self.predictors.setdefault(name, [0, 0])
+            totals[0] += int(count)
+            totals[1] += int(paired_count)
+
+        for name, user_id in set(zip(predictors.tolist(), user_ids.tolist())):
+            self.predictor_users.setdefault(name, set()).add(user_id)
+        for key in set(zip(predictors[is_paired].tolist(),
+                           outcomes[is_paired].tolist(),
+                           user_ids[is_paired].tolist())):
+            self.pair_users.setdefault(key[:2], set()).add(key[2])
+
+        keys, inverse = np.unique(
+            predictors[is_paired] + '\x1f' + outcomes[is_paired],
+            return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(keys))
+        sums = np.bincount(inverse, weights=lags, minlength=len(keys))
+        for key, count, lag_sum in zip(keys, counts, sums):
+            totals = self.pairs.setdefault(tuple(key.split('\x1f')), [0, 0.0])
+            totals[0] += int(count)
+            totals[1] += float(lag_sum)
+
+    def quantiles(self):
+        """Returns the lag quantiles in minutes, from the minute bins"""
+        if not self.paired:
+            return {}
+        cumulative = np.cumsum(self.minutes)
+        return {
+            'p{}'.format(int(q * 100)): int(np.searchsorted(
+                cumulative, q * self.paired, side='left'))
+            for q in QUANTILES
+        }
+
+    @property
+    def lag_mean(self):
+        return self.lag_sum / self.paired if self.paired else 0.0
+
+    @property
+    def lag_stdev(self):
+        if self.paired < 2:
+            return 0.0
+        variance = (self.lag_squares - self.paired * self.lag_mean ** 2) / (
+            self.paired - 1)
+        return float(np.sqrt(max(variance, 0.0)))
+
+    def summary(self, min_users=MIN_COHORT_USERS):
+        """
+        Returns the aggregates as a JSON serializable dictionary, without any
+        group of fewer than min_users users
+        """
+        if len(self.users) < min_users:
+            return {'users': len(self.users), 'min_users': min_users,
+                    'suppressed': True}
+        return {
+            'users': len(self.users),
+            'sessions': self.sessions,
+            'paired': self.paired,
+            'unpaired': self.sessions - self.paired,
+            'pairing_rate': self.paired / self.sessions if self.sessions else 0.0,
+            'lag_mean': self.lag_mean,
+            'lag_stdev': self.lag_stdev,
+            'lag_quantiles': self.quantiles(),
+            'lag_histogram': [
+                {'bucket': label, 'count': int(count)}
+                for label, count in zip(bucket_labels(), self.histogram)
+            ],
+            'predictors': [
+                {'predictor': name, 'users': len(self.predictor_users[name]),
+                 'sessions': sessions, 'paired': paired,
+                 'pairing_rate': paired / sessions}
+                for name, (sessions, paired) in sorted(self.predictors.items())
+                if len(self.predictor_users[name]) >= min_users
+            ],
+            'pairs': [
+                {'predictor': predictor, 'outcome': outcome,
+                 'users': len(self.pair_users[(predictor, outcome)]),
+                 'paired': count, 'lag_mean': lag_sum / count}
+                for (predictor, outcome), (count, lag_sum)
+                in sorted(self.pairs.items())
+                if len(self.pair_users[(predictor, outcome)]) >= min_users
+            ]
+        }
+
+
+def analyze_cohort(storage, predictor=None, outcome=None, batch_size=100000,
+                   min_users=MIN_COHORT_USERS):
+    """
+    Returns the summary of every closed session matching the keywords
+    Args:
+        storage (DBStorage): storage the sessions are read from
+        predictor (str): predictor name, every predictor when None
+        outcome (str): outcome name, every outcome when None
+        batch_size (int): sessions per chunk
+        min_users (int): smallest group of users reported
+    """
+    analysis = CohortAnalysis()
+    for rows in storage.iter_cohort_sessions(predictor, outcome, batch_size):
+        analysis.add(rows)
+    return analysis.summary(min_users)
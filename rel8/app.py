@@ -3,12 +3,11 @@
 import binascii
 import csv
 import datetime
-from dateutil import relativedelta
 from flask import abort, flash, Flask, jsonify, render_template
 from flask import redirect, request, session, stream_with_context, url_for
-from flask_bcrypt import Bcrypt
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from io import StringIO
+from itertools import groupby
 import models
 from models.interval import Interval
 from models.outcome import Outcome
@@ -20,8 +19,22 @@ import os
 import phonenumbers
 import pytz
 from pytz import timezone
+from rel8.cli import archive_payloads, cohort_stats, create_schema, export_history, import_csv
+from rel8.cli import rebuild_stats
+from rel8.cli import send_reminders, sms_queue_stats, sms_workers, sweep_sessions
+from rel8.conversation import conversation_store
+from rel8.export import export_lines, gzip_chunks
 from rel8.forms import RegistrationForm, PasswordForm, LoginForm, VariablesForm
-from rel8.utils import get_local_dt
+from rel8.idempotency import MessageLog
+from rel8.keywords import KeywordIndex, normalize_keyword, parse_variables, PREDICTOR
+from rel8.ingest import SmsQueue
+from rel8 import metrics
+from rel8.passwords import PasswordHasher
+from rel8.sweeper import SessionSweeper
+from rel8.utils import decode_cursor, encode_cursor, format_local, format_local_many
+from rel8.utils import minutes_between, to_local
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
 from twilio.twiml.messaging_response import MessagingResponse
 from werkzeug.datastructures import Headers
 from werkzeug import wrappers
@@ -34,28 +47,81 @@ app = Flask(__name__)
 app.url_map.strict_slashes = False
 app.secret_key = os.getenv('SECRET_KEY')
 
-bcrypt = Bcrypt(app)
+app.cli.add_command(archive_payloads)
+app.cli.add_command(cohort_stats)
+app.cli.add_command(create_schema)
+app.cli.add_command(export_history)
+app.cli.add_command(import_csv)
+app.cli.add_command(rebuild_stats)
+app.cli.add_command(send_reminders)
+app.cli.add_command(sms_queue_stats)
+app.cli.add_command(sms_workers)
+app.cli.add_command(sweep_sessions)
+
+passwords = PasswordHasher(
+    rounds=int(os.getenv('REL8_BCRYPT_ROUNDS', default=12)),
+    workers=int(os.getenv('REL8_BCRYPT_WORKERS', default=2))
+)
 
 SITE_URL = os.getenv('SITE_URL')
+DASHBOARD_PAGE_SIZE = int(os.getenv('REL8_DASHBOARD_PAGE_SIZE', default=50))
+CSV_BATCH_SIZE = int(os.getenv('REL8_CSV_BATCH_SIZE', default=1000))
+CSV_CHUNK_ROWS = int(os.getenv('REL8_CSV_CHUNK_ROWS', default=500))
+SMS_QUEUE_PATH = os.getenv('REL8_SMS_QUEUE')
+APP_SWEEP_INTERVAL = os.getenv('REL8_APP_SWEEP_INTERVAL')
+SLOW_REQUEST_MS = os.getenv('REL8_SLOW_REQUEST_MS')
+EXPORT_BATCH_SIZE = int(os.getenv('REL8_EXPORT_BATCH_SIZE', default=1000))
 
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+metrics.init_app(app, slow_request_ms=float(SLOW_REQUEST_MS) if SLOW_REQUEST_MS else None)
+models.storage.on_engine(metrics.instrument_engine)
+
+sms_queue = SmsQueue(SMS_QUEUE_PATH) if SMS_QUEUE_PATH else None
+
+if APP_SWEEP_INTERVAL:
+    # started by the first request, so CLI commands and workers importing
+    # the app never run one
+    sweeper = SessionSweeper(models.storage,
+                             interval=float(APP_SWEEP_INTERVAL))
+    app.before_first_request(sweeper.start)
+
+conversations = conversation_store(
+    os.getenv('REL8_CONVERSATION_STORE', default='memory'),
+    ttl=int(os.getenv('REL8_CONVERSATION_TTL', default=3600)),
+    maxsize=int(os.getenv('REL8_CONVERSATION_CACHE_SIZE', default=10000))
+)
+
+processed_messages = MessageLog(
+    maxsize=int(os.getenv('REL8_MESSAGE_CACHE_SIZE', default=10000)),
+    retention=int(os.getenv('REL8_MESSAGE_RETENTION', default=86400))
+)
+
+keyword_index = KeywordIndex(
+    maxsize=int(os.getenv('REL8_KEYWORD_CACHE_SIZE', default=10000)),
+    ttl=int(os.getenv('REL8_KEYWORD_CACHE_TTL', default=300))
+)
+
+
+@app.teardown_appcontext
+def close_storage(error):
+    models.storage.close()
+
 
 @login_manager.user_loader
 def load_user(user_id):
     return models.storage.get(User, user_id)
 
 
-def get_session():
-    counter = session.get('counter', 0)
-    counter += 1
-    session['counter'] = counter
-    consent = session.get('consent', False)
-    name_req = session.get('name_req', False)
+def get_conversation(phone_number):
+    state = conversations.get(phone_number)
+    state['counter'] = state.get('counter', 0) + 1
+    consent = state.get('consent', False)
+    name_req = state.get('name_req', False)
 
-    return session, counter, consent, name_req
+    return state, consent, name_req
 
 
 def standardize_phone(phone_number):
@@ -67,11 +133,17 @@ def standardize_phone(phone_number):
 
 def find_user_by_phone(phone_number):
     phone_number_formatted = standardize_phone(phone_number)
-    users = models.storage.all(User)
-    for user in users.values():
-        if user.phone_number == phone_number_formatted:
-            return user
-    return None
+    return models.storage.get_by(User, phone_number=phone_number_formatted)
+
+
+@event.listens_for(Predictor, 'after_insert')
+@event.listens_for(Predictor, 'after_update')
+@event.listens_for(Predictor, 'after_delete')
+@event.listens_for(Outcome, 'after_insert')
+@event.listens_for(Outcome, 'after_update')
+@event.listens_for(Outcome, 'after_delete')
+def invalidate_keyword_index(mapper, connection, target):
+    keyword_index.invalidate(target.user_id)
 
 
 @app.route('/register', methods=['GET', 'POST'])
@@ -82,7 +154,7 @@ def register():
         user = find_user_by_phone(form.phone_number.data)
         if user:
             if user.access_code == form.access_code.data:
-                user.password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+                user.password = passwords.generate_password_hash(form.password.data)
                 user.timezone = form.timezone.data
                 user.save()
                 return redirect(url_for('login'))
@@ -112,7 +184,10 @@ def login():
                 error = 'Set up a password first'
                 form = RegistrationForm()
                 return render_template('register.html', form=form, error=error)
-            elif bcrypt.check_password_hash(user.password, form.password.data):
+            elif passwords.check_password_hash(user.password, form.password.data):
+                if passwords.needs_rehash(user.password):
+                    user.password = passwords.generate_password_hash(form.password.data)
+                    user.save()
                 login_user(user)
                 session['user-id'] = user.id #TODO: keep?
                 return redirect(url_for('dashboard'))
@@ -137,22 +212,83 @@ def logout():
 def dashboard():
     error = None
     responses = []
-    current_user.sessions.sort(key=lambda session: session.updated_at, reverse=False)
-    for session in current_user.sessions:
+    before = decode_cursor(request.args.get('before'))
+    after = decode_cursor(request.args.get('after'))
+    sessions, more = models.storage.sessions_page(
+        current_user.id, DASHBOARD_PAGE_SIZE, before=before, after=after
+    )
+    for session in sessions:
         session.responses.sort(key=lambda response: response.updated_at, reverse=False)
         if len(session.responses) == 1:
             responses.append((session.responses[0], ))
         elif len(session.responses) == 2:
-            diff = relativedelta.relativedelta(session.responses[1].updated_at, session.responses[0].updated_at)
-            responses.append((session.responses[0], session.responses[1], diff.minutes))
+            diff = minutes_between(session.responses[0].updated_at, session.responses[1].updated_at)
+            responses.append((session.responses[0], session.responses[1], int(diff)))
+
+    shown = [response for row in responses for response in row[:2]]
+    times = dict(zip(
+        [response.id for response in shown],
+        format_local_many([response.updated_at for response in shown], current_user.timezone)
+    ))
+
+    prev_cursor = None
+    next_cursor = None
+    if sessions:
+        if more or after:
+            prev_cursor = encode_cursor(sessions[0].updated_at, sessions[0].id)
+        if (more and after) or before:
+            next_cursor = encode_cursor(sessions[-1].updated_at, sessions[-1].id)
+
+    return render_template(
+        'dashboard.html', error=error, user=current_user, responses=responses,
+        times=times, prev_cursor=prev_cursor, next_cursor=next_cursor,
+        stat=models.storage.get_stats(current_user.id)
+    )
+
+
+@app.route('/api/stats', methods=['GET'])
+@login_required
+def stats():
+    return jsonify(models.storage.get_stats(current_user.id).summary())
 
-    return render_template('dashboard.html', error=error, user=current_user, responses=responses)
+
+@app.route('/api/responses/<response_id>/payload', methods=['GET'])
+@login_required
+def response_payload(response_id):
+    response = models.storage.get(Response, response_id)
+    if response is None or response.user_id != current_user.id:
+        abort(404)
+    payload = models.storage.get_payload(response_id)
+    if payload is None:
+        abort(404)
+    return jsonify(payload)
+
+
+@app.route('/api/export', methods=['GET'])
+@login_required
+def export():
+    cursor = request.args.get('cursor')
+    if cursor and decode_cursor(cursor) is None:
+        abort(400)
+    chunks = export_lines(models.storage, current_user.id, cursor,
+                          EXPORT_BATCH_SIZE)
+    headers = Headers()
+    headers.set('Vary', 'Accept-Encoding')
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        chunks = gzip_chunks(chunks)
+        headers.set('Content-Encoding', 'gzip')
+    return wrappers.Response(
+        stream_with_context(chunks),
+        mimetype='application/x-ndjson', headers=headers
+    )
 
 
 @app.route('/csv')
+@login_required
 def csv_download():
-    now = datetime.datetime.now()
-    filename = "{}.csv".format(get_local_dt(now, human=True, format='%Y-%m-%d_%H.%M.%S'))
+    now = datetime.datetime.utcnow()
+    tz = current_user.timezone
+    filename = "{}.csv".format(format_local(now, tz, format='%Y-%m-%d_%H.%M.%S'))
 
     def generate():
         data = StringIO()
@@ -163,34 +299,43 @@ def csv_download():
         data.seek(0)
         data.truncate(0)
 
-        current_user.sessions.sort(key=lambda session: session.updated_at, reverse=False)
-        for session in current_user.sessions:
-            session.responses.sort(key=lambda response: response.updated_at, reverse=False)
-            if len(session.responses) == 1:
+        rows = models.storage.iter_session_responses(current_user.id, CSV_BATCH_SIZE)
+        pending = 0
+        for session_id, responses in groupby(rows, key=lambda row: row[0]):
+            responses = list(responses)
+            if len(responses) == 1:
                 writer.writerow(
                     (
-                        get_local_dt(session.responses[0].updated_at),
-                        session.responses[0].message,
+                        to_local(responses[0].updated_at, tz),
+                        responses[0].message,
                         '',
                         '',
                         ''
                     )
                 )
-            elif len(session.responses) == 2:
-                diff = relativedelta.relativedelta(session.responses[1].updated_at, session.responses[0].updated_at)
+            elif len(responses) == 2:
+                diff = minutes_between(responses[0].updated_at, responses[1].updated_at)
                 writer.writerow(
                     (
-                        get_local_dt(session.responses[0].updated_at),
-                        session.responses[0].message,
-                        get_local_dt(session.responses[1].updated_at),
-                        session.responses[1].message,
-                        diff.minutes
+                        to_local(responses[0].updated_at, tz),
+                        responses[0].message,
+                        to_local(responses[1].updated_at, tz),
+                        responses[1].message,
+                        int(diff)
                     )
                 )
+            else:
+                continue
+
+            pending += 1
+            if pending == CSV_CHUNK_ROWS:
+                yield data.getvalue()
+                data.seek(0)
+                data.truncate(0)
+                pending = 0
 
+        if pending:
             yield data.getvalue()
-            data.seek(0)
-            data.truncate(0)
 
     headers = Headers()
     headers.set('Content-Disposition', 'attachment', filename=filename)
@@ -206,58 +351,74 @@ def csv_download():
 def password(user=None):
     form = PasswordForm()
     if form.validate_on_submit():
-        current_user.password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        current_user.password = passwords.generate_password_hash(form.password.data)
         current_user.save()
         flash('Updated password')
 
     return render_template('password.html', form=form)
 
 
+def format_variables(variables):
+    return '\n'.join(', '.join(variable.keywords())
+                     for variable in variables if variable.active)
+
+
+def sync_variables(cls, variables, parsed, user_id):
+    """Updates a user's predictors or outcomes to match the form lines
+
+    Variables no longer listed are deactivated rather than deleted, their
+    responses keep pointing at them.
+    """
+    by_name = {variable.name: variable for variable in variables}
+    names = set()
+    for name, synonyms in parsed:
+        names.add(name)
+        variable = by_name.get(name)
+        if variable is None:
+            variable = cls(name=name, user_id=user_id)
+            models.storage.new(variable)
+            variables.append(variable)
+        variable.synonyms = ', '.join(synonyms) or None
+        variable.active = True
+    for variable in variables:
+        if variable.name not in names:
+            variable.active = False
+
+
 @app.route('/variables', methods=['GET', 'POST'])
 @login_required
 def variables():
     error = None
-    predictor = ''
-    outcome = ''
-    duration = ''
-
-    if current_user.predictor:
-        predictor = current_user.predictor.name
-        outcome = current_user.outcome.name
-        duration = current_user.interval.duration
-
     data = {
-        'predictor': predictor,
-        'outcome': outcome,
-        'duration': duration
+        'predictors': format_variables(current_user.predictors),
+        'outcomes': format_variables(current_user.outcomes),
+        'duration': current_user.interval.duration if current_user.interval else ''
     }
 
     form = VariablesForm(data=data)
     if form.validate_on_submit():
-        if current_user.predictor:
-            current_user.predictor.name = form.predictor.data.strip().lower()
-            current_user.outcome.name = form.outcome.data.strip().lower()
+        sync_variables(Predictor, current_user.predictors,
+                       parse_variables(form.predictors.data), current_user.id)
+        sync_variables(Outcome, current_user.outcomes,
+                       parse_variables(form.outcomes.data), current_user.id)
+        if current_user.interval:
             current_user.interval.duration = form.duration.data
             flash('Variables updated')
         else:
-            predictor = Predictor(
-                name=form.predictor.data.strip().lower(),
-                user_id=current_user.id
-            )
-            outcome = Outcome(
-                name=form.outcome.data.strip().lower(),
-                user_id=current_user.id
-            )
             interval = Interval(
                 duration=form.duration.data,
                 user_id=current_user.id
             )
-            models.storage.new(predictor)
-            models.storage.new(outcome)
             models.storage.new(interval)
             flash('Variables added')
 
+        # the keyword index of every process is versioned on updated_at,
+        # which moves at least a second as MySQL DATETIME drops fractions
+        current_user.updated_at = max(
+            datetime.datetime.utcnow(),
+            current_user.updated_at + datetime.timedelta(seconds=1))
         models.storage.save()
+        keyword_index.invalidate(current_user.id)
 
     return render_template('variables.html', form=form, error=error)
 
@@ -268,100 +429,172 @@ def session_expired(created_at, interval):
     return now > created_at + delta
 
 
-def new_session(user, message, response):
+def new_session(user, predictor_id, message, payload):
     sms_session = Session(
         user_id=user.id,
         interval_id=user.interval.id
     )
     models.storage.new(sms_session)
-    models.storage.save()
-
-    if message.strip().lower() == user.predictor.name:
-        sms_response = Response(
-            session_id=sms_session.id,
-            predictor_id=user.predictor.id,
-            user_id=user.id,
-            message=message,
-            twilio_json="{}"
-        )
-        models.storage.new(sms_response)
-        models.storage.save()
+    sms_response = Response(
+        session_id=sms_session.id,
+        predictor_id=predictor_id,
+        user_id=user.id,
+        message=message
+    )
+    models.storage.new(sms_response)
+    models.storage.archive_payload(sms_response.id, payload)
+
+
+def handle_variable_message(user, message, response, payload):
+    """Applies a predictor or outcome text to the user's session state
+
+    The text is classified through the user's keyword index, payload holds
+    the webhook form fields stored with the response. Changes are only
+    staged on the storage session, the caller commits.
+    """
+    vocabulary = keyword_index.get(user)
+    kind, variable_id = vocabulary.keywords[normalize_keyword(message)]
+    expecting_predictor = 'We were expecting predictor: {}'.format(
+        ', '.join(vocabulary.predictors))
+    sms_session = models.storage.current_session(user.id)
+    if kind == PREDICTOR:
+        if sms_session is None:
+            new_session(user, variable_id, message, payload)
+        elif session_expired(sms_session.created_at, sms_session.interval.duration):
+            if models.storage.close_session(sms_session):
+                models.storage.get_stats(user.id, for_update=True).record_unpaired()
+            new_session(user, variable_id, message, payload)
+        else:
+            response.message('We were expecting outcome: {}'.format(
+                ', '.join(vocabulary.outcomes)))
     else:
-        response.message('This should be the predictor.')
+        if sms_session is None:
+            response.message(expecting_predictor)
+        elif session_expired(sms_session.created_at, sms_session.interval.duration):
+            if models.storage.close_session(sms_session):
+                models.storage.get_stats(user.id, for_update=True).record_unpaired()
+            response.message(expecting_predictor)
+        elif not models.storage.close_session(sms_session):
+            # the sweeper closed it as unpaired since it was read
+            response.message(expecting_predictor)
+        else:
+            sms_response = Response(
+                session_id=sms_session.id,
+                outcome_id=variable_id,
+                user_id=user.id,
+                message=message
+            )
+            models.storage.new(sms_response)
+            models.storage.archive_payload(sms_response.id, payload)
+            models.storage.get_stats(user.id, for_update=True).record_pair(
+                minutes_between(sms_session.created_at, sms_response.created_at)
+            )
+
+
+def has_variables(user):
+    vocabulary = keyword_index.get(user)
+    return bool(vocabulary.predictors and vocabulary.outcomes and user.interval)
+
+
+def apply_queued_message(phone_number, message, payload):
+    """Runs a message taken off the ingestion queue through the state machine
+
+    Returns the reply the webhook would have sent, the caller commits.
+    """
+    response = MessagingResponse()
+    user = find_user_by_phone(phone_number)
+    if user and has_variables(user) and keyword_index.classify(user, message):
+        handle_variable_message(user, message, response, payload)
+    return response
 
 
 @app.route('/sms', methods=['POST'])
 def sms():
-    session, counter, consent, name_req = get_session()
+    message_sid = request.form.get('MessageSid')
+    if message_sid:
+        twiml = processed_messages.get(message_sid)
+        if twiml is not None:
+            return twiml
+
     response = MessagingResponse()
-    phone_number = request.form['From']
+    phone_number = standardize_phone(request.form['From'])
     message = request.form['Body']
+    queued = None
     user = find_user_by_phone(phone_number)
+    if not user:
+        state, consent, name_req = get_conversation(phone_number)
     if user:
-        if not user.predictor and not user.outcome:
+        if not has_variables(user):
             response.message(
                 "Hi {}. You need to set up your variables first: {}".format(
                     user.username, SITE_URL
                 )
             )
-        elif message.strip().lower() != user.predictor.name and message.strip().lower() != user.outcome.name:
+        elif keyword_index.classify(user, message) is None:
             response.message('That does not match your variables. Try again.')
+        elif sms_queue:
+            # enqueued only once the MessageSid is committed, so a retry
+            # losing the race on it never queues the text a second time
+            queued = (user.phone_number, message, request.form.to_dict())
         else:
-            user.sessions.sort(key=lambda sess: sess.updated_at, reverse=True)
-            if message.strip().lower() == user.predictor.name:
-                if len(user.sessions) == 0 or user.sessions[0].complete is True:
-                    new_session(user, message, response)
-                elif user.sessions[0].complete is False:
-                    if session_expired(user.sessions[0].created_at, user.sessions[0].interval.duration):
-                        user.sessions[0].complete = True
-                        new_session(user, message, response)
-                    else:
-                        response.message('We were expecting outcome: {}'.format(user.outcome.name))
-            elif message.strip().lower() == user.outcome.name:
-                if len(user.sessions) == 0 or user.sessions[0].complete is True:
-                    response.message('We were expecting predictor: {}'.format(user.predictor.name))
-                elif user.sessions[0].complete is False:
-                    if session_expired(user.sessions[0].created_at, user.sessions[0].interval.duration):
-                        user.sessions[0].complete = True
-                        response.message('We were expecting predictor: {}'.format(user.predictor.name))
-                    else:
-                        sms_response = Response(
-                            session_id=user.sessions[0].id,
-                            outcome_id=user.outcome.id,
-                            user_id=user.id,
-                            message=message,
-                            twilio_json="{}"
-                        )
-                        models.storage.new(sms_response)
-                        user.sessions[0].complete = True
-                        models.storage.save()
+            handle_variable_message(user, message, response,
+                                    request.form.to_dict())
     elif consent is True and name_req is True:
         access_code = binascii.hexlify(os.urandom(8)).decode()
-        session['access-code'] = access_code
         user = User()
         user.username = message.strip()
         user.phone_number = phone_number
         user.access_code = access_code
         models.storage.new(user)
-        models.storage.save()
-        session['user-id'] = user.id
+        conversations.delete(phone_number)
         response.message(
             "Welcome {}! Please go to: {}/register/?access-code={}".format(
                 user.username, SITE_URL, access_code
             )
         )
     elif consent is True and name_req is False:
-        session['name_req'] = True
+        state['name_req'] = True
         if message.strip().lower() == 'yes':
-            session['consent'] = True
+            state['consent'] = True
             response.message("What's your name?")
+            conversations.set(phone_number, state)
         elif message.strip().lower() == 'no':
             response.message("Sorry to hear that. Bye.")
+            conversations.delete(phone_number)
+        else:
+            conversations.set(phone_number, state)
     else:
         response.message("Would you like to enroll in rel8? [Yes, No]")
-        session['consent'] = True
+        state['consent'] = True
+        conversations.set(phone_number, state)
 
-    return str(response)
+    twiml = str(response)
+    if message_sid:
+        processed_messages.stage(message_sid, twiml)
+    try:
+        models.storage.save()
+    except IntegrityError:
+        models.storage.rollback()
+        replay = processed_messages.get(message_sid) if message_sid else None
+        if replay is None:
+            raise
+        return replay
+    if queued:
+        sms_queue.put(*queued)
+    if message_sid:
+        processed_messages.remember(message_sid, twiml)
+    return twiml
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return wrappers.Response(
+        metrics.render(
+            pool=models.storage.pool_status(),
+            queue=sms_queue.metrics() if sms_queue else None
+        ),
+        mimetype='text/plain; version=0.0.4'
+    )
 
 
 @app.errorhandler(403)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""In-process cache module"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Bounded mapping with least-recently-used eviction and per-entry expiry
+    """
+    def __init__(self, maxsize=1024, ttl=300):
+        """
+        Args:
+            maxsize (int): number of entries kept before evicting the oldest
+            ttl (int): seconds an entry stays valid after it is set
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.__data = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for key or default if missing or expired
+        """
+        with self.__lock:
+            item = self.__data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self.__data[key]
+                return default
+            self.__data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        Stores value under key, evicting least recently used entries
+        """
+        with self.__lock:
+            self.__data[key] = (value, time.monotonic() + self.ttl)
+            self.__data.move_to_end(key)
+            while len(self.__data) > self.maxsize:
+                self.__data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """
+        Removes key and returns its value if it was cached
+        """
+        with self.__lock:
+            item = self.__data.pop(key, None)
+        if item is None:
+            return default
+        return item[0]
+
+    def clear(self):
+        """
+        Removes every entry
+        """
+        with self.__lock:
+            self.__data.clear()
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__data)
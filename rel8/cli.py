@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""rel8 command line tasks, run with FLASK_APP=rel8.app flask <command>"""
+import click
+import json
+from flask.cli import with_appcontext
+import models
+from models.engine.db_storage import SCHEMA_VERSION
+from models.user import User
+import os
+import time
+from rel8.export import export_lines, gzip_chunks
+from rel8.importer import CSVImportError, HistoryImporter
+from rel8.ingest import SmsQueue, start_workers
+from rel8.keywords import normalize_keyword
+from rel8.reminders import ReminderDispatcher, ReminderSender
+from rel8.reminders import StubTransport, TwilioTransport
+from rel8.sweeper import SessionSweeper
+from rel8.utils import decode_cursor, minutes_between
+
+
+@click.command('create-schema')
+def create_schema():
+    """Create the missing tables and record the schema version."""
+    models.storage.create_schema()
+    click.echo('Schema at version {}'.format(SCHEMA_VERSION))
+
+
+@click.command('rebuild-stats')
+@with_appcontext
+def rebuild_stats():
+    """Recompute every user's statistics from their closed sessions."""
+    for user in models.storage.all(User).values():
+        # locked first, like live texts do, so none is lost while rebuilding
+        stat = models.storage.get_stats(user.id, for_update=True)
+        stat.reset()
+        for opened_at, responses, last_at in models.storage.closed_sessions(user.id):
+            if responses == 2:
+                stat.record_pair(minutes_between(opened_at, last_at))
+            elif responses == 1:
+                stat.record_unpaired()
+        models.storage.save()
+        click.echo('{}: {} paired, {} unpaired'.format(
+            user.username, stat.paired, stat.unpaired))
+
+
+@click.command('cohort-stats')
+@click.option('--predictor', help='Only sessions opened by this predictor.')
+@click.option('--outcome', help='Only users tracking this outcome.')
+@click.option('--batch-size', type=int,
+              default=lambda: int(os.getenv('REL8_COHORT_BATCH_SIZE', 100000)),
+              help='Sessions read and aggregated per chunk.')
+@click.option('--min-users', type=int,
+              default=lambda: int(os.getenv('REL8_COHORT_MIN_USERS', 10)),
+              help='Leave out keywords and cohorts of fewer users.')
+def cohort_stats(predictor, outcome, batch_size, min_users):
+    """Print lag and pairing statistics across every user as JSON."""
+    from rel8.analytics import analyze_cohort
+
+    start = time.perf_counter()
+    summary = analyze_cohort(
+        models.storage,
+        predictor=normalize_keyword(predictor) if predictor else None,
+        outcome=normalize_keyword(outcome) if outcome else None,
+        batch_size=batch_size,
+        min_users=min_users)
+    click.echo(json.dumps(summary, indent=2))
+    click.echo('{} users in {:.2f}s'.format(
+        summary['users'], time.perf_counter() - start), err=True)
+
+
+def get_sms_queue():
+    path = os.getenv('REL8_SMS_QUEUE')
+    if not path:
+        raise click.UsageError('REL8_SMS_QUEUE is not set')
+    return SmsQueue(path)
+
+
+@click.command('sms-workers')
+@click.option('--workers', type=int,
+              default=lambda: int(os.getenv('REL8_SMS_WORKERS', 4)),
+              help='Worker processes, each owning a share of phone numbers.')
+@click.option('--batch-size', type=int,
+              default=lambda: int(os.getenv('REL8_SMS_BATCH_SIZE', 100)),
+              help='Messages applied per commit.')
+@click.option('--poll-interval', type=float, default=0.1,
+              help='Seconds an idle worker waits before polling again.')
+def sms_workers(workers, batch_size, poll_interval):
+    """Apply queued SMS until interrupted."""
+    queue = get_sms_queue()
+    processes = start_workers(queue.path, workers, batch_size, poll_interval)
+    click.echo('Started {} workers on {}'.format(workers, queue.path))
+    for process in processes:
+        process.join()
+
+
+@click.command('sms-queue-stats')
+def sms_queue_stats():
+    """Print the SMS queue depth and lag."""
+    metrics = get_sms_queue().metrics()
+    click.echo('depth: {depth}\nlag: {lag_seconds:.1f}s'.format(**metrics))
+
+
+@click.command('sweep-sessions')
+@click.option('--loop', is_flag=True,
+              help='Keep sweeping every --interval seconds.')
+@click.option('--interval', type=float,
+              default=lambda: float(os.getenv('REL8_SWEEP_INTERVAL', 60)),
+              help='Seconds between passes with --loop.')
+def sweep_sessions(loop, interval):
+    """Close every open session past its interval."""
+    sweeper = SessionSweeper(models.storage, interval)
+    while True:
+        click.echo('Closed {} expired sessions'.format(sweeper.sweep()))
+        if not loop:
+            break
+        time.sleep(interval)
+
+
+def get_transport(name):
+    if name == 'stub':
+        return StubTransport()
+    for key in ('TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN', 'TWILIO_PHONE_NUMBER'):
+        if not os.getenv(key):
+            raise click.UsageError('{} is not set'.format(key))
+    return TwilioTransport(os.getenv('TWILIO_ACCOUNT_SID'),
+                           os.getenv('TWILIO_AUTH_TOKEN'),
+                           os.getenv('TWILIO_PHONE_NUMBER'))
+
+
+@click.command('send-reminders')
+@click.option('--loop', is_flag=True,
+              help='Keep dispatching every --interval seconds.')
+@click.option('--interval', type=float, default=60,
+              help='Seconds between passes with --loop.')
+@click.option('--lead', type=float,
+              default=lambda: float(os.getenv('REL8_REMINDER_LEAD', 15)),
+              help='Minutes before expiry a session is reminded.')
+@click.option('--rate', type=float,
+              default=lambda: float(os.getenv('REL8_REMINDER_RATE', 500)),
+              help='Messages sent per second at most.')
+@click.option('--concurrency', type=int,
+              default=lambda: int(os.getenv('REL8_REMINDER_CONCURRENCY', 32)),
+              help='Sends in flight at the same time.')
+@click.option('--retries', type=int,
+              default=lambda: int(os.getenv('REL8_REMINDER_RETRIES', 3)),
+              help='Extra attempts after a failed send.')
+@click.option('--batch-size', type=int, default=1000,
+              help='Sessions claimed per UPDATE.')
+@click.option('--transport', type=click.Choice(['twilio', 'stub']),
+              default=lambda: os.getenv('REL8_REMINDER_TRANSPORT', 'twilio'),
+              help='Send through Twilio or keep messages in memory.')
+def send_reminders(loop, interval, lead, rate, concurrency, retries,
+                   batch_size, transport):
+    """Text users whose open session is about to expire."""
+    sender = ReminderSender(get_transport(transport), rate=rate,
+                            concurrency=concurrency, retries=retries)
+    dispatcher = ReminderDispatcher(models.storage, sender, lead, batch_size)
+    while True:
+        click.echo('Sent {} reminders, {} failed'.format(*dispatcher.dispatch()))
+        if not loop:
+            break
+        time.sleep(interval)
+
+
+@click.command('archive-payloads')
+@click.option('--batch-size', type=int, default=1000,
+              help='Responses read per transaction.')
+def archive_payloads(batch_size):
+    """Copy payloads from responses.twilio_json into response_payloads."""
+    archived = models.storage.archive_legacy_payloads(batch_size)
+    click.echo('Archived {} payloads, responses.twilio_json can be dropped'
+               .format(archived))
+
+
+@click.command('export')
+@click.option('--phone', help='Export only this user, everyone otherwise.')
+@click.option('--cursor', help='Continue after the last cursor line of a '
+              'previous export.')
+@click.option('--output', type=click.File('wb'), default='-',
+              help='File to write, standard output by default.')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--batch-size', type=int,
+              default=lambda: int(os.getenv('REL8_EXPORT_BATCH_SIZE', 1000)),
+              help='Sessions read per batch.')
+@with_appcontext
+def export_history(phone, cursor, output, compress, batch_size):
+    """Stream sessions and responses as NDJSON."""
+    from rel8.app import find_user_by_phone
+
+    user_id = None
+    if phone:
+        user = find_user_by_phone(phone)
+        if user is None:
+            raise click.UsageError('No user with phone number {}'.format(phone))
+        user_id = user.id
+    if cursor and decode_cursor(cursor) is None:
+        raise click.UsageError('Invalid cursor {}'.format(cursor))
+    chunks = export_lines(models.storage, user_id, cursor, batch_size)
+    if compress:
+        chunks = gzip_chunks(chunks)
+    for chunk in chunks:
+        output.write(chunk if compress else chunk.encode('utf-8'))
+
+
+@click.command('import-csv')
+@click.argument('path', type=click.File('r', encoding='utf-8'))
+@click.option('--phone', required=True,
+              help='Phone number of the user the history belongs to.')
+@click.option('--batch-size', type=int, default=1000,
+              help='Sessions inserted per transaction.')
+@with_appcontext
+def import_csv(path, phone, batch_size):
+    """Import predictor/outcome history from a CSV like the /csv download."""
+    from rel8.app import find_user_by_phone
+
+    user = find_user_by_phone(phone)
+    if user is None:
+        raise click.UsageError('No user with phone number {}'.format(phone))
+    if not (user.predictor and user.outcome and user.interval):
+        raise click.UsageError('{} has not set up variables'.format(user.username))
+
+    def progress(counts):
+        click.echo('{rows} rows, {sessions} sessions, {responses} responses'
+                   .format(**counts))
+
+    importer = HistoryImporter(user, batch_size=batch_size, progress=progress)
+    try:
+        counts = importer.run(path)
+    except CSVImportError as error:
+        models.storage.rollback()
+        raise click.ClickException(str(error))
+    click.echo('Done: {rows} rows imported, {rejected} texts rejected, '
+               '{unmatched} texts matching no variable skipped'
+               .format(**counts))
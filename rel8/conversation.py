@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""SMS conversation state store module
+
+Holds the enrollment state (consent, name_req, counter) of phone numbers
+that are not users yet, keyed by normalized phone number, instead of in the
+cookie Twilio echoes back.
+"""
+from datetime import datetime, timedelta
+import json
+import models
+from models.conversation import Conversation
+from rel8.cache import TTLCache
+
+
+class MemoryConversationStore:
+    """
+    Per-process store evicting conversations after ttl seconds or when
+    more than maxsize are kept
+    """
+    def __init__(self, ttl=3600, maxsize=10000):
+        self.__cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, phone_number):
+        """Returns a copy of the state of a phone number, empty if unknown"""
+        return dict(self.__cache.get(phone_number, {}))
+
+    def set(self, phone_number, state):
+        """Stores the state of a phone number and restarts its ttl"""
+        self.__cache.set(phone_number, dict(state))
+
+    def delete(self, phone_number):
+        """Forgets a phone number"""
+        self.__cache.pop(phone_number)
+
+
+class DBConversationStore:
+    """
+    Store shared by every worker through the conversations table
+
+    Expired rows are ignored on read and purged every purge_every writes.
+    Writes are only staged in the request's transaction, which the caller
+    commits once together with its other changes.
+    """
+    def __init__(self, ttl=3600, purge_every=100):
+        self.ttl = timedelta(seconds=ttl)
+        self.purge_every = purge_every
+        self.__writes = 0
+
+    def get(self, phone_number):
+        """Returns the state of a phone number, empty if unknown or expired"""
+        conversation = models.storage.get_by(
+            Conversation, phone_number=phone_number)
+        if conversation is None or conversation.expires_at < datetime.utcnow():
+            return {}
+        return json.loads(conversation.state)
+
+    def set(self, phone_number, state):
+        """
+        Stores the state of a phone number and restarts its ttl, in the
+        request's transaction
+        """
+        now = datetime.utcnow()
+        models.storage.upsert(
+            Conversation, {'phone_number': phone_number},
+            {'state': json.dumps(state), 'expires_at': now + self.ttl})
+        self.__writes += 1
+        if self.__writes % self.purge_every == 0:
+            models.storage.purge(Conversation, now, in_session=True)
+
+    def delete(self, phone_number):
+        """Forgets a phone number, in the request's transaction"""
+        conversation = models.storage.get_by(
+            Conversation, phone_number=phone_number)
+        if conversation is not None:
+            models.storage.discard(conversation)
+
+
+def conversation_store(kind, ttl, maxsize):
+    """
+    Returns the store selected by kind, 'memory' or 'db'
+    """
+    if kind == 'db':
+        return DBConversationStore(ttl=ttl)
+    if kind == 'memory':
+        return MemoryConversationStore(ttl=ttl, maxsize=maxsize)
+    raise ValueError('Unknown conversation store: {}'.format(kind))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""NDJSON export module
+
+Writes sessions and their responses as one JSON object per line, straight
+from the column tuples storage streams, without building ORM objects.
+Each table gets a serializer compiled once from its columns: the JSON text
+between values is precomputed and every column has an encoder picked from
+its type. A cursor line after each batch tells where to resume.
+"""
+import json
+from json.encoder import encode_basestring_ascii
+from models.base_model import IdType
+from models.response import Response
+from models.session import Session
+from rel8.utils import decode_cursor, encode_cursor
+from sqlalchemy import Boolean, DateTime, Integer, String
+import zlib
+
+
+def encode_string(value):
+    return 'null' if value is None else encode_basestring_ascii(value)
+
+
+def encode_datetime(value):
+    return 'null' if value is None else '"' + value.isoformat() + '"'
+
+
+def encode_bool(value):
+    return 'null' if value is None else ('true' if value else 'false')
+
+
+def encode_int(value):
+    return 'null' if value is None else str(int(value))
+
+
+def encoder_for(column):
+    if isinstance(column.type, DateTime):
+        return encode_datetime
+    if isinstance(column.type, Boolean):
+        return encode_bool
+    if isinstance(column.type, Integer):
+        return encode_int
+    if isinstance(column.type, (IdType, String)):
+        return encode_string
+    return json.dumps
+
+
+def compile_serializer(kind, columns):
+    """
+    Returns a function turning a row of columns into an NDJSON line
+    Args:
+        kind (str): value of the "type" key of every line
+        columns (list): table columns, in the order of the row values
+    """
+    prefixes = ['{"type":' + encode_basestring_ascii(kind) + ',"' +
+                columns[0].name + '":']
+    prefixes.extend(',"' + column.name + '":' for column in columns[1:])
+    encoders = [encoder_for(column) for column in columns]
+    fields = list(zip(prefixes, encoders))
+
+    def serialize(row):
+        return ''.join([prefix + encode(value)
+                        for (prefix, encode), value in zip(fields, row)]) + '}\n'
+    return serialize
+
+
+session_line = compile_serializer('session', list(Session.__table__.columns))
+response_line = compile_serializer('response', list(Response.__table__.columns))
+
+
+def export_lines(storage, user_id=None, cursor=None, batch_size=1000):
+    """
+    Yields NDJSON text, each session followed by its responses, one chunk
+    per batch ending with a {"type":"cursor"} line to resume from
+    Args:
+        storage (DBStorage): storage the history is read from
+        user_id (str): only this user's history, everything when None
+        cursor (str): cursor of a previous export to continue after
+        batch_size (int): sessions per chunk
+    """
+    for sessions, responses in storage.iter_export(
+            user_id, decode_cursor(cursor), batch_size):
+        by_session = {}
+        for row in responses:
+            by_session.setdefault(row.session_id, []).append(row)
+        lines = []
+        for row in sessions:
+            lines.append(session_line(row))
+            lines.extend(response_line(child)
+                         for child in by_session.get(row.id, ()))
+        last = sessions[-1]
+        lines.append('{"type":"cursor","cursor":' + encode_basestring_ascii(
+            encode_cursor(last.updated_at, last.id)) + '}\n')
+        yield ''.join(lines)
+
+
+def gzip_chunks(chunks, level=6):
+    """
+    Compresses text chunks into one gzip stream, flushing after each chunk
+    so a client can decode everything received so far
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode('utf-8')) + \
+            compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 from flask_wtf import FlaskForm
+from rel8.keywords import parse_variables
 from wtforms import IntegerField, PasswordField, SelectField, StringField, SubmitField
+from wtforms import TextAreaField
 from wtforms.validators import DataRequired, EqualTo, Length, NumberRange
+from wtforms.validators import ValidationError
 
 
 class RegistrationForm(FlaskForm):
@@ -39,11 +42,38 @@ class LoginForm(FlaskForm):
     submit = SubmitField('Login')
 
 
+def check_variables(form, field):
+    seen = set()
+    for name, synonyms in parse_variables(field.data):
+        for keyword in [name] + synonyms:
+            if not 2 <= len(keyword) <= 20:
+                raise ValidationError(
+                    '"{}" must be 2 to 20 characters'.format(keyword))
+            if keyword in seen:
+                raise ValidationError(
+                    '"{}" is listed more than once'.format(keyword))
+            seen.add(keyword)
+        if len(', '.join(synonyms)) > 255:
+            raise ValidationError('Too many synonyms for "{}"'.format(name))
+    if not parse_variables(field.data):
+        raise ValidationError('Enter at least one')
+
+
 class VariablesForm(FlaskForm):
-    predictor = StringField('Predictor', validators=[
-        DataRequired(), Length(min=2, max=20)])
-    outcome = StringField('Outcome', validators=[
-        DataRequired(), Length(min=2, max=20)])
+    predictors = TextAreaField('Predictors', validators=[
+        DataRequired(), check_variables])
+    outcomes = TextAreaField('Outcomes', validators=[
+        DataRequired(), check_variables])
     duration = IntegerField('Duration', validators=[
         DataRequired(), NumberRange(min=1)])
     submit = SubmitField('Submit')
+
+    def validate_outcomes(self, field):
+        keywords = set()
+        for name, synonyms in parse_variables(self.predictors.data):
+            keywords.update([name] + synonyms)
+        for name, synonyms in parse_variables(field.data):
+            shared = keywords.intersection([name] + synonyms)
+            if shared:
+                raise ValidationError('"{}" is also a predictor'.format(
+                    sorted(shared)[0]))
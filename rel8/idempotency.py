@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Webhook idempotency module
+
+Twilio retries a webhook it did not get an answer to in time. Every handled
+MessageSid is recorded with the TwiML sent back, in a bounded cache in front
+of the processed_messages table, so a retry is answered with the same reply
+without running the session state machine again.
+"""
+from datetime import datetime, timedelta
+import models
+from models.processed_message import ProcessedMessage
+from rel8.cache import TTLCache
+
+
+class MessageLog:
+    """
+    Processed MessageSids and their replies, kept retention seconds
+    """
+    def __init__(self, maxsize=10000, retention=86400, purge_every=1000):
+        """
+        Args:
+            maxsize (int): replies cached in process
+            retention (int): seconds a MessageSid is remembered
+            purge_every (int): recorded messages between purges of the table
+        """
+        self.retention = timedelta(seconds=retention)
+        self.purge_every = purge_every
+        self.__cache = TTLCache(maxsize=maxsize, ttl=retention)
+        self.__records = 0
+
+    def get(self, message_sid):
+        """Returns the TwiML replied to a MessageSid, None if not seen"""
+        twiml = self.__cache.get(message_sid)
+        if twiml is None:
+            message = models.storage.get_by(
+                ProcessedMessage, message_sid=message_sid)
+            if message is None:
+                return None
+            if message.expires_at < datetime.utcnow():
+                # not purged yet: drop it with this request's transaction so
+                # stage() can record the MessageSid again
+                models.storage.discard(message)
+                return None
+            twiml = message.twiml
+            self.__cache.set(message_sid, twiml)
+        return twiml
+
+    def stage(self, message_sid, twiml):
+        """
+        Adds a MessageSid to the storage session, committed by the caller
+        together with the changes it caused
+        """
+        models.storage.new(ProcessedMessage(
+            message_sid=message_sid, twiml=twiml,
+            expires_at=datetime.utcnow() + self.retention))
+
+    def remember(self, message_sid, twiml):
+        """Caches the reply of a MessageSid once it is committed"""
+        self.__cache.set(message_sid, twiml)
+        self.__records += 1
+        if self.__records % self.purge_every == 0:
+            models.storage.purge(ProcessedMessage, datetime.utcnow())
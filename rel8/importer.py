@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""Historical predictor/outcome import module
+
+Rebuilds sessions and responses from a CSV laid out like the /csv download,
+replaying the texts through the same pairing and expiry rules as /sms.
+"""
+import csv
+import datetime
+import models
+from models.base_model import new_id
+from models.response import Response
+from models.session import Session
+from models.user_stat import UserStat
+import pytz
+from rel8.keywords import build_vocabulary, normalize_keyword, OUTCOME, PREDICTOR
+from rel8.utils import get_timezone, minutes_between
+
+
+class CSVImportError(ValueError):
+    """Raised when a CSV row cannot be imported"""
+
+
+class HistoryImporter:
+    """
+    Replays historical texts of one user and bulk inserts the result
+
+    Closed sessions and their responses are buffered and written with
+    multi-row inserts, committing every batch_size sessions. Statistics are
+    gathered apart and added to the user's row, locked, by the last commit,
+    so live texts updating it meanwhile are not overwritten. Texts that are
+    none of the user's keywords are skipped and counted as unmatched.
+    """
+    def __init__(self, user, batch_size=1000, progress=None):
+        """
+        Args:
+            user (User): user the history belongs to, with variables set
+            batch_size (int): sessions written per transaction
+            progress (callable): called with the counters after each commit
+        """
+        self.user = user
+        self.batch_size = batch_size
+        self.progress = progress
+        self.tz = get_timezone(user.timezone)
+        self.duration = datetime.timedelta(hours=user.interval.duration)
+        self.stat = UserStat(user_id=user.id)
+        self.stat.reset()
+        self.vocabulary = build_vocabulary(user)
+        self.open = None
+        self.last_at = None
+        self.sessions = []
+        self.responses = []
+        self.counts = {'rows': 0, 'sessions': 0, 'responses': 0,
+                       'rejected': 0, 'unmatched': 0}
+
+    def parse_dt(self, value):
+        dt = datetime.datetime.fromisoformat(value.strip())
+        if dt.tzinfo is None:
+            dt = self.tz.localize(dt)
+        return dt.astimezone(pytz.utc).replace(tzinfo=None)
+
+    def variable_id(self, kind, message):
+        """
+        Returns the id of the variable a text names, None when the text is
+        not one of the user's keywords of that kind
+        """
+        match = self.vocabulary.keywords.get(normalize_keyword(message))
+        return match[1] if match and match[0] == kind else None
+
+    def response(self, at, message, predictor_id=None, outcome_id=None):
+        return {
+            'id': new_id(),
+            'created_at': at,
+            'updated_at': at,
+            'session_id': self.open['id'],
+            'predictor_id': predictor_id,
+            'outcome_id': outcome_id,
+            'user_id': self.user.id,
+            'message': message,
+            'error': False
+        }
+
+    def close(self, at, paired):
+        self.open['complete'] = True
+        self.open['updated_at'] = at
+        if not paired:
+            self.stat.record_unpaired()
+        self.sessions.append(self.open)
+        self.open = None
+        if len(self.sessions) >= self.batch_size:
+            self.flush()
+
+    def expired(self, at):
+        return at > self.open['created_at'] + self.duration
+
+    def predictor(self, at, message):
+        predictor_id = self.variable_id(PREDICTOR, message)
+        if predictor_id is None:
+            self.counts['unmatched'] += 1
+            return
+        if self.open is not None:
+            if not self.expired(at):
+                self.counts['rejected'] += 1
+                return
+            self.close(self.open['created_at'], paired=False)
+        self.open = {
+            'id': new_id(),
+            'created_at': at,
+            'updated_at': at,
+            'user_id': self.user.id,
+            'interval_id': self.user.interval.id,
+            'complete': False
+        }
+        self.responses.append(
+            self.response(at, message, predictor_id=predictor_id))
+
+    def outcome(self, at, message):
+        outcome_id = self.variable_id(OUTCOME, message)
+        if outcome_id is None:
+            self.counts['unmatched'] += 1
+            return
+        if self.open is None:
+            self.counts['rejected'] += 1
+            return
+        if self.expired(at):
+            self.close(self.open['created_at'], paired=False)
+            self.counts['rejected'] += 1
+            return
+        self.responses.append(
+            self.response(at, message, outcome_id=outcome_id))
+        self.stat.record_pair(minutes_between(self.open['created_at'], at))
+        self.close(at, paired=True)
+
+    def row(self, row):
+        """
+        Replays one CSV row, its predictor text first then its outcome
+        """
+        events = []
+        if row.get('predictor dt') and row.get('predictor'):
+            events.append((self.parse_dt(row['predictor dt']),
+                           self.predictor, row['predictor']))
+        if row.get('outcome dt') and row.get('outcome'):
+            events.append((self.parse_dt(row['outcome dt']),
+                           self.outcome, row['outcome']))
+        for at, apply, message in events:
+            if self.last_at and at < self.last_at:
+                raise CSVImportError(
+                    'Row {}: texts must be in chronological order'.format(
+                        self.counts['rows'] + 1))
+            self.last_at = at
+            apply(at, message)
+        self.counts['rows'] += 1
+
+    def flush(self, last=False):
+        """
+        Writes buffered sessions and the responses ready with them, and with
+        the last commit the gathered statistics
+        """
+        open_id = self.open['id'] if self.open else None
+        responses = [r for r in self.responses if r['session_id'] != open_id]
+        self.responses = [r for r in self.responses
+                          if r['session_id'] == open_id]
+        models.storage.bulk_insert(Session, self.sessions)
+        models.storage.bulk_insert(Response, responses)
+        if last:
+            models.storage.get_stats(self.user.id, for_update=True).merge(
+                self.stat)
+        models.storage.save()
+        self.counts['sessions'] += len(self.sessions)
+        self.counts['responses'] += len(responses)
+        self.sessions = []
+        if self.progress:
+            self.progress(self.counts)
+
+    def finish(self):
+        """
+        Closes the last session if it has expired and writes what is left
+
+        The last session is left open only if it is still within its
+        interval and the user has no open session already.
+        """
+        if self.open is not None:
+            now = datetime.datetime.utcnow()
+            if self.expired(now) or models.storage.current_session(self.user.id):
+                self.close(self.open['created_at'], paired=False)
+            else:
+                self.sessions.append(self.open)
+                self.open = None
+        self.flush(last=True)
+        return self.counts
+
+    def run(self, lines):
+        """
+        Imports an iterable of CSV lines and returns the counters
+        """
+        for row in csv.DictReader(lines):
+            self.row(row)
+        return self.finish()
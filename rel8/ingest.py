@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""SMS ingestion queue module
+
+With REL8_SMS_QUEUE set, the /sms webhook only validates a predictor or
+outcome text and appends it to a SQLite file queue. Worker processes then
+apply the session state machine and commit once per batch.
+"""
+import json
+import logging
+from multiprocessing import get_context
+import sqlite3
+import threading
+import time
+import zlib
+
+
+logger = logging.getLogger(__name__)
+
+
+SHARDS = 2 ** 32
+
+
+def shard_range(worker, workers):
+    """
+    Returns the [low, high) range of crc32 shards owned by a worker
+    """
+    return SHARDS * worker // workers, SHARDS * (worker + 1) // workers
+
+
+class SmsQueue:
+    """
+    Durable local queue of inbound SMS backed by a SQLite file
+
+    Each message is stamped with a shard derived from its phone number and
+    every worker owns one contiguous range of shards, so it sees every
+    message of a user and applies them in arrival order. The (shard, id)
+    index serves each worker's poll from its own range only.
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): SQLite file holding the queue, created if missing
+        """
+        self.path = path
+        self.__local = threading.local()
+        self.__connect().execute(
+            'CREATE TABLE IF NOT EXISTS messages ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'shard INTEGER NOT NULL, '
+            'phone_number TEXT NOT NULL, '
+            'body TEXT NOT NULL, '
+            'payload TEXT NOT NULL, '
+            'enqueued_at REAL NOT NULL)'
+        )
+        self.__connect().execute(
+            'CREATE INDEX IF NOT EXISTS ix_messages_shard_id '
+            'ON messages (shard, id)'
+        )
+
+    def __connect(self):
+        """
+        Returns the connection of the calling thread
+        """
+        conn = getattr(self.__local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.__local.conn = conn
+        return conn
+
+    def put(self, phone_number, body, payload):
+        """
+        Appends a message to the queue
+        Args:
+            phone_number (str): normalized phone number of the sender
+            body (str): text of the message
+            payload (dict): webhook form fields
+        """
+        self.__connect().execute(
+            'INSERT INTO messages '
+            '(shard, phone_number, body, payload, enqueued_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (zlib.crc32(phone_number.encode()), phone_number, body,
+             json.dumps(payload), time.time())
+        )
+
+    def take(self, worker, workers, limit):
+        """
+        Returns the oldest messages of a worker's shards without removing them
+        Args:
+            worker (int): index of the worker
+            workers (int): number of workers sharing the queue
+            limit (int): maximum number of messages
+        Returns:
+            list of (id, phone_number, body, payload) tuples in arrival order
+        """
+        low, high = shard_range(worker, workers)
+        rows = self.__connect().execute(
+            'SELECT id, phone_number, body, payload FROM messages '
+            'WHERE shard >= ? AND shard < ? ORDER BY id LIMIT ?',
+            (low, high, limit)
+        ).fetchall()
+        return [(id, phone_number, body, json.loads(payload))
+                for id, phone_number, body, payload in rows]
+
+    def ack(self, ids):
+        """
+        Removes processed messages
+        """
+        conn = self.__connect()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            conn.execute(
+                'DELETE FROM messages WHERE id IN ({})'.format(
+                    ', '.join('?' * len(chunk))),
+                chunk
+            )
+
+    def metrics(self):
+        """
+        Returns the queue depth and the age in seconds of its oldest message
+        """
+        depth, oldest = self.__connect().execute(
+            'SELECT COUNT(*), MIN(enqueued_at) FROM messages').fetchone()
+        return {
+            'depth': depth,
+            'lag_seconds': time.time() - oldest if oldest else 0.0
+        }
+
+
+def process_batch(rows, handler, storage):
+    """
+    Applies a batch of messages and commits them together
+
+    When the batch fails it is rolled back and replayed one message per
+    commit, so a single bad message does not hold back its neighbours.
+    """
+    try:
+        for id, phone_number, body, payload in rows:
+            handler(phone_number, body, payload)
+        storage.save()
+        return
+    except Exception:
+        logger.exception('Batch of %d messages failed, retrying one by one',
+                         len(rows))
+        storage.rollback()
+    for id, phone_number, body, payload in rows:
+        try:
+            handler(phone_number, body, payload)
+            storage.save()
+        except Exception:
+            logger.exception('Dropping queued message %d', id)
+            storage.rollback()
+
+
+def run_worker(path, worker, workers, batch_size, poll_interval):
+    """
+    Worker process loop draining the shards of one worker
+    """
+    import models
+    from rel8.app import apply_queued_message
+
+    queue = SmsQueue(path)
+    while True:
+        rows = queue.take(worker, workers, batch_size)
+        if not rows:
+            time.sleep(poll_interval)
+            continue
+        process_batch(rows, apply_queued_message, models.storage)
+        models.storage.close()
+        queue.ack([row[0] for row in rows])
+
+
+def start_workers(path, workers, batch_size, poll_interval):
+    """
+    Starts one process per worker and returns them
+    """
+    context = get_context('spawn')
+    processes = []
+    for worker in range(workers):
+        process = context.Process(
+            target=run_worker,
+            args=(path, worker, workers, batch_size, poll_interval),
+            name='rel8-sms-worker-{}'.format(worker),
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+    return processes
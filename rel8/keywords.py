@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Per-user keyword index module
+
+Every active predictor and outcome of a user, with its synonyms, is turned
+into one dictionary from normalized keyword to variable, so classifying an
+SMS is a single lookup whatever the size of the vocabulary. Vocabularies are
+cached per user along with the user's updated_at, which saving the variables
+moves forward, so every process rebuilds one on the first text after an edit.
+"""
+from collections import namedtuple
+import logging
+from rel8.cache import TTLCache
+
+
+logger = logging.getLogger(__name__)
+
+
+PREDICTOR = 'predictor'
+OUTCOME = 'outcome'
+
+Vocabulary = namedtuple('Vocabulary', ['keywords', 'predictors', 'outcomes'])
+
+
+def normalize_keyword(text):
+    """Lower cases text and collapses its whitespace"""
+    return ' '.join(text.lower().split())
+
+
+def parse_variables(text):
+    """
+    Parses one variable per line, its synonyms following after commas
+    Returns:
+        list of (name, [synonyms]) tuples
+    """
+    variables = []
+    for line in text.splitlines():
+        words = [normalize_keyword(word) for word in line.split(',')]
+        words = [word for word in words if word]
+        if words:
+            variables.append((words[0], words[1:]))
+    return variables
+
+
+def build_vocabulary(user):
+    """
+    Returns the Vocabulary of a user's active predictors and outcomes
+
+    keywords maps every name and synonym to a (kind, variable id) tuple,
+    predictors and outcomes list the names used in replies. The variables
+    form rejects a keyword listed twice; one saved before that check keeps
+    its first variable and is logged.
+    """
+    keywords = {}
+    names = {PREDICTOR: [], OUTCOME: []}
+    for kind, variables in ((PREDICTOR, user.predictors),
+                            (OUTCOME, user.outcomes)):
+        for variable in variables:
+            if not variable.active:
+                continue
+            names[kind].append(variable.name)
+            for keyword in variable.keywords():
+                if keyword in keywords:
+                    logger.warning('User %s lists "%s" more than once',
+                                   user.id, keyword)
+                    continue
+                keywords[keyword] = (kind, variable.id)
+    return Vocabulary(keywords, names[PREDICTOR], names[OUTCOME])
+
+
+class KeywordIndex:
+    """
+    In-process cache of user vocabularies
+    """
+    def __init__(self, maxsize=10000, ttl=300):
+        """
+        Args:
+            maxsize (int): vocabularies kept before evicting the oldest
+            ttl (int): seconds a vocabulary is kept, whatever its version
+        """
+        self.__cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, user):
+        """
+        Returns the Vocabulary of a user, building it on a miss or when the
+        user's updated_at differs from the one it was built with
+        """
+        entry = self.__cache.get(user.id)
+        if entry is None or entry[0] != user.updated_at:
+            entry = (user.updated_at, build_vocabulary(user))
+            self.__cache.set(user.id, entry)
+        return entry[1]
+
+    def classify(self, user, message):
+        """
+        Returns the (kind, variable id) a message names, None if none
+        """
+        return self.get(user).keywords.get(normalize_keyword(message))
+
+    def invalidate(self, user_id):
+        """Drops the vocabulary of a user"""
+        self.__cache.pop(user_id)
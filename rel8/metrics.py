@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""Request and SQL instrumentation module
+
+Flask request hooks time every request per route and SQLAlchemy engine hooks
+count and time the statements each route issues. Everything is kept in
+process and rendered in the Prometheus text format by render().
+"""
+from bisect import bisect_left
+import logging
+import threading
+import time
+from flask import g, has_request_context, request
+
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = []
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """
+    Cumulative histogram of observations, one series per label values
+    """
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.__series = {}
+        self.__lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, *label_values):
+        with self.__lock:
+            series = self.__series.get(label_values)
+            if series is None:
+                series = self.__series[label_values] = [
+                    [0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help),
+                 '# TYPE {} histogram'.format(self.name)]
+        with self.__lock:
+            items = sorted((k, (list(v[0]), v[1]))
+                           for k, v in self.__series.items())
+        for label_values, (counts, total) in items:
+            labels = format_labels(self.labels, label_values)
+            cumulative = 0
+            for upper, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(
+                    self.name,
+                    format_labels(self.labels + ('le',),
+                                  label_values + (str(upper),)),
+                    cumulative))
+            lines.append('{}_sum{} {}'.format(self.name, labels, total))
+            lines.append('{}_count{} {}'.format(self.name, labels, cumulative))
+        return lines
+
+
+class Counter:
+    """
+    Monotonic counter, one series per label values
+    """
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.__series = {}
+        self.__lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, value, *label_values):
+        with self.__lock:
+            self.__series[label_values] = self.__series.get(
+                label_values, 0) + value
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help),
+                 '# TYPE {} counter'.format(self.name)]
+        with self.__lock:
+            items = sorted(self.__series.items())
+        for label_values, value in items:
+            lines.append('{}{} {}'.format(
+                self.name, format_labels(self.labels, label_values), value))
+        return lines
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"'))
+        for name, value in zip(names, values)))
+
+
+def snapshot(prefix, help, values):
+    """
+    Renders a dictionary of numbers as metrics named prefix_key, counters
+    for keys ending in _total and gauges for the others
+    """
+    lines = []
+    for key, value in sorted(values.items()):
+        name = '{}_{}'.format(prefix, key)
+        lines.append('# HELP {} {} {}'.format(name, help, key.replace('_', ' ')))
+        lines.append('# TYPE {} {}'.format(
+            name, 'counter' if key.endswith('_total') else 'gauge'))
+        lines.append('{} {}'.format(name, value))
+    return lines
+
+
+request_seconds = Histogram(
+    'rel8_request_duration_seconds', 'Request latency by route.',
+    ('route', 'method', 'status'), LATENCY_BUCKETS)
+request_statements = Histogram(
+    'rel8_request_sql_statements', 'SQL statements issued per request.',
+    ('route',), COUNT_BUCKETS)
+sql_statements = Counter(
+    'rel8_sql_statements_total', 'SQL statements executed by route.',
+    ('route',))
+sql_seconds = Counter(
+    'rel8_sql_seconds_total', 'Time spent executing SQL by route.',
+    ('route',))
+
+
+def current_route():
+    if not has_request_context():
+        return 'background'
+    if request.url_rule is None:
+        return 'unmatched'
+    return request.url_rule.rule
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    # kept on the execution context, dropped with it when the statement fails
+    if context is not None:
+        context.rel8_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context,
+                         executemany):
+    started = getattr(context, 'rel8_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    route = current_route()
+    sql_statements.inc(1, route)
+    sql_seconds.inc(elapsed, route)
+    if has_request_context() and hasattr(g, 'rel8_statements'):
+        g.rel8_statements.append((elapsed, statement))
+
+
+def instrument_engine(engine):
+    """
+    Registers the statement counting hooks on a SQLAlchemy engine
+    """
+    from sqlalchemy import event
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+def init_app(app, slow_request_ms=None):
+    """
+    Registers the request timing hooks on a Flask app
+
+    Requests slower than slow_request_ms are logged with their statements.
+    """
+    @app.before_request
+    def start_timer():
+        g.rel8_started = time.perf_counter()
+        g.rel8_statements = []
+
+    @app.after_request
+    def record_request(response):
+        if not hasattr(g, 'rel8_started'):
+            return response
+        elapsed = time.perf_counter() - g.rel8_started
+        route = current_route()
+        request_seconds.observe(elapsed, route, request.method,
+                                response.status_code)
+        request_statements.observe(len(g.rel8_statements), route)
+        if slow_request_ms and elapsed * 1000 >= slow_request_ms:
+            log_slow_request(route, elapsed, g.rel8_statements)
+        return response
+
+
+def log_slow_request(route, elapsed, statements, limit=20):
+    lines = ['{} {} took {:.0f} ms with {} statements ({:.0f} ms in SQL)'.format(
+        request.method, route, elapsed * 1000, len(statements),
+        sum(seconds for seconds, statement in statements) * 1000)]
+    slowest = sorted(statements, key=lambda item: item[0], reverse=True)
+    for seconds, statement in slowest[:limit]:
+        lines.append('  {:8.1f} ms  {}'.format(
+            seconds * 1000, ' '.join(statement.split())[:300]))
+    logger.warning('\n'.join(lines))
+
+
+def render(pool=None, queue=None):
+    """
+    Returns every metric in the Prometheus text exposition format
+    Args:
+        pool (dict): DBStorage.pool_status() to export
+        queue (dict): SmsQueue.metrics() to export
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    if pool:
+        lines.extend(snapshot('rel8_pool', 'Connection pool', pool))
+    if queue:
+        lines.extend(snapshot('rel8_sms_queue', 'SMS ingestion queue', queue))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Password hashing module
+
+bcrypt hashes and checks run in a bounded process pool, so a burst of logins
+waits for a pool slot instead of occupying the CPU the request workers
+serving /sms need. Hash times are recorded per operation and cost.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import threading
+import time
+import bcrypt
+from rel8 import metrics
+
+
+hash_seconds = metrics.Histogram(
+    'rel8_bcrypt_seconds', 'Time to hash or check a password.',
+    ('operation', 'rounds'),
+    (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+
+def hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'),
+                         bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def check_password(pw_hash, password):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'),
+                              pw_hash.encode('utf-8'))
+    except ValueError:
+        return False
+
+
+def hash_rounds(pw_hash):
+    """Returns the cost a bcrypt hash was made with, None if it is not one"""
+    try:
+        return int(pw_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """
+    bcrypt front end submitting every hash and check to a process pool
+    """
+    def __init__(self, rounds=12, workers=2):
+        """
+        Args:
+            rounds (int): work factor of new hashes
+            workers (int): processes hashing at the same time
+        """
+        self.rounds = rounds
+        self.workers = workers
+        self.__executor = None
+        self.__lock = threading.Lock()
+
+    def __submit(self, operation, rounds, fn, *args):
+        if self.__executor is None:
+            with self.__lock:
+                if self.__executor is None:
+                    self.__executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=get_context('spawn'))
+        start = time.perf_counter()
+        result = self.__executor.submit(fn, *args).result()
+        hash_seconds.observe(time.perf_counter() - start, operation, rounds)
+        return result
+
+    def generate_password_hash(self, password):
+        """Returns the bcrypt hash of a password at the configured cost"""
+        return self.__submit('hash', self.rounds, hash_password,
+                             password, self.rounds)
+
+    def check_password_hash(self, pw_hash, password):
+        """
+        Returns True if password matches the hash, False when the stored
+        value is not a bcrypt hash
+        """
+        rounds = hash_rounds(pw_hash)
+        if rounds is None:
+            return False
+        return self.__submit('check', rounds, check_password,
+                             pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """Returns True if the hash was made with another cost or unreadable"""
+        return hash_rounds(pw_hash) != self.rounds
+
+    def shutdown(self):
+        if self.__executor is not None:
+            self.__executor.shutdown()
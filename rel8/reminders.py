@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Outbound reminder module
+
+A dispatcher claims open sessions about to expire in batches and sends each
+user a reminder to text their outcome. Sending goes through a thread pool
+limited by a token bucket, retrying failed sends with exponential backoff,
+so a large backlog drains at the provider's rate without a web worker ever
+waiting on it.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+import threading
+import time
+from rel8 import metrics
+
+
+logger = logging.getLogger(__name__)
+
+REMINDER = ('Your {duration} hour window closes soon. '
+            'Text "{outcome}" if it happened.')
+
+reminders_total = metrics.Counter(
+    'rel8_reminders_total', 'Reminder SMS by result.', ('status',))
+reminder_attempts = metrics.Counter(
+    'rel8_reminder_attempts_total', 'Reminder send attempts by result.',
+    ('status',))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at rate tokens per second
+    """
+    def __init__(self, rate, burst=None):
+        """
+        Args:
+            rate (float): tokens added per second
+            burst (int): tokens the bucket holds, defaults to one second
+        """
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.__tokens = float(self.capacity)
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and takes it"""
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                self.__tokens = min(
+                    self.capacity,
+                    self.__tokens + (now - self.__updated) * self.rate)
+                self.__updated = now
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                wait = (1 - self.__tokens) / self.rate
+            time.sleep(wait)
+
+
+class TwilioTransport:
+    """
+    Sends SMS through the Twilio REST API
+    """
+    def __init__(self, account_sid, auth_token, from_number):
+        from twilio.rest import Client
+
+        self.client = Client(account_sid, auth_token)
+        self.from_number = from_number
+
+    def send(self, to, body):
+        self.client.messages.create(to=to, from_=self.from_number, body=body)
+
+
+class StubTransport:
+    """
+    Local transport keeping sent messages in memory instead of calling
+    Twilio, with an optional latency and a number of failures per recipient
+    """
+    def __init__(self, latency=0.0, failures=0):
+        """
+        Args:
+            latency (float): seconds each send takes
+            failures (int): sends to each recipient failing before one works
+        """
+        self.latency = latency
+        self.failures = failures
+        self.sent = []
+        self.__attempts = {}
+        self.__lock = threading.Lock()
+
+    def send(self, to, body):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.__lock:
+            attempts = self.__attempts[to] = self.__attempts.get(to, 0) + 1
+            if attempts <= self.failures:
+                raise IOError('Stub failure {} for {}'.format(attempts, to))
+            self.sent.append((to, body))
+
+
+class ReminderSender:
+    """
+    Concurrent, rate-limited sender retrying failed messages
+    """
+    def __init__(self, transport, rate=100, burst=None, concurrency=32,
+                 retries=3, backoff=0.5):
+        """
+        Args:
+            transport: object with a send(to, body) method
+            rate (float): messages sent per second at most
+            burst (int): messages that may go out at once after a pause
+            concurrency (int): sends in flight at the same time
+            retries (int): extra attempts after a failed send
+            backoff (float): seconds before the first retry, doubled after
+        """
+        self.transport = transport
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+
+    def send(self, to, body):
+        """Sends one message, returns True once it went through"""
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            try:
+                self.transport.send(to, body)
+            except Exception as error:
+                reminder_attempts.inc(1, 'error')
+                logger.warning('Reminder to %s failed (attempt %d): %s',
+                               to, attempt + 1, error)
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+                continue
+            reminder_attempts.inc(1, 'sent')
+            return True
+        return False
+
+    def send_batch(self, messages):
+        """
+        Sends (to, body) pairs concurrently
+        Returns:
+            list telling for each message, in order, whether it was sent
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = list(pool.map(lambda message: self.send(*message),
+                                    messages))
+        sent = sum(results)
+        reminders_total.inc(sent, 'sent')
+        reminders_total.inc(len(results) - sent, 'failed')
+        return results
+
+
+class ReminderDispatcher:
+    """
+    Claims sessions due a reminder and hands them to a sender
+    """
+    def __init__(self, storage, sender, lead=15, batch_size=1000):
+        """
+        Args:
+            storage (DBStorage): storage whose sessions are reminded
+            sender (ReminderSender): sender of the reminders
+            lead (float): minutes before expiry a reminder goes out
+            batch_size (int): sessions claimed and sent together
+        """
+        self.storage = storage
+        self.sender = sender
+        self.lead = timedelta(minutes=lead)
+        self.batch_size = batch_size
+
+    def dispatch(self, now=None):
+        """
+        Sends every due reminder and returns the numbers sent and failed
+        Sessions whose reminder failed every attempt are released again,
+        so a later run retries them while they are still due.
+        """
+        sent = failed = 0
+        for rows in self.storage.claim_reminders(
+                self.lead, now=now, batch_size=self.batch_size):
+            results = self.sender.send_batch([
+                (phone_number, REMINDER.format(outcome=outcome,
+                                               duration=duration))
+                for session_id, phone_number, outcome, duration in rows
+            ])
+            self.storage.release_reminders([
+                row[0] for row, ok in zip(rows, results) if not ok])
+            sent += sum(results)
+            failed += len(results) - sum(results)
+        logger.info('Sent %d reminders, %d failed', sent, failed)
+        return sent, failed
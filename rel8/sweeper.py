@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""Expired session sweeper module"""
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class SessionSweeper(threading.Thread):
+    """
+    Background thread closing expired sessions every interval seconds
+    """
+    def __init__(self, storage, interval=60):
+        """
+        Args:
+            storage (DBStorage): storage whose sessions are swept
+            interval (float): seconds between passes
+        """
+        super().__init__(name='rel8-session-sweeper', daemon=True)
+        self.storage = storage
+        self.interval = interval
+        self.__stopped = threading.Event()
+
+    def sweep(self):
+        """
+        Runs one pass and returns the number of sessions it closed
+        """
+        closed = self.storage.close_expired_sessions()
+        logger.info('Closed %d expired sessions', closed)
+        return closed
+
+    def run(self):
+        while not self.__stopped.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception('Session sweep failed')
+
+    def stop(self):
+        self.__stopped.set()
@@ -1,16 +1,62 @@
 #!/usr/bin/env python3
 import datetime
+import functools
 from flask_login import current_user
-import pytz
 from pytz import timezone
 
 
-def get_local_dt(dt, human=False, format='%b %-d, %Y, %-I:%M %p'):
-    tz = timezone(current_user.timezone)
-    utc = timezone('UTC')
-    dt = utc.localize(dt, is_dst=None).astimezone(pytz.utc)
-    local_dt = dt.astimezone(tz)
+HUMAN_FORMAT = '%b %-d, %Y, %-I:%M %p'
 
+
+@functools.lru_cache(maxsize=None)
+def get_timezone(name):
+    """Returns the tzinfo of a zone name, looked up once per process"""
+    return timezone(name or 'UTC')
+
+
+def to_local(dt, tz_name):
+    """Converts a naive UTC datetime to an aware one in tz_name"""
+    return get_timezone(tz_name).fromutc(dt)
+
+
+def to_local_many(dts, tz_name):
+    """Converts a column of naive UTC datetimes to aware ones in tz_name"""
+    fromutc = get_timezone(tz_name).fromutc
+    return [fromutc(dt) for dt in dts]
+
+
+def format_local(dt, tz_name, format=HUMAN_FORMAT):
+    """Formats a naive UTC datetime in tz_name"""
+    return get_timezone(tz_name).fromutc(dt).strftime(format)
+
+
+def format_local_many(dts, tz_name, format=HUMAN_FORMAT):
+    """Formats a column of naive UTC datetimes in tz_name"""
+    fromutc = get_timezone(tz_name).fromutc
+    return [fromutc(dt).strftime(format) for dt in dts]
+
+
+def get_local_dt(dt, human=False, format=HUMAN_FORMAT, tz=None):
+    if tz is None:
+        tz = current_user.timezone
     if human:
-        return local_dt.strftime(format)
-    return local_dt
+        return format_local(dt, tz, format)
+    return to_local(dt, tz)
+
+
+def minutes_between(start, end):
+    return (end - start).total_seconds() / 60
+
+
+def encode_cursor(updated_at, id):
+    return '{}_{}'.format(updated_at.strftime('%Y-%m-%dT%H:%M:%S.%f'), id)
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        updated_at, id = cursor.split('_', 1)
+        return datetime.datetime.strptime(updated_at, '%Y-%m-%dT%H:%M:%S.%f'), id
+    except ValueError:
+        return None
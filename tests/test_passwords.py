@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""Tests of password hashing"""
+import unittest
+
+from rel8.passwords import check_password, hash_password, hash_rounds
+from rel8.passwords import PasswordHasher
+
+MALFORMED = [None, '', 'plaintext', '$2b$', '$2b$xx$abc', '$2b$04$short']
+
+
+class TestPasswordHasher(unittest.TestCase):
+    """Tests of PasswordHasher with stored values that are not hashes"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.hasher = PasswordHasher(rounds=4, workers=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.hasher.shutdown()
+
+    def test_hash_rounds(self):
+        self.assertEqual(hash_rounds(hash_password('secret12', 4)), 4)
+        for pw_hash in MALFORMED[:-1]:
+            self.assertIsNone(hash_rounds(pw_hash))
+
+    def test_malformed_hash_fails_check(self):
+        for pw_hash in MALFORMED:
+            self.assertFalse(self.hasher.check_password_hash(
+                pw_hash, 'secret12'))
+
+    def test_malformed_hash_needs_rehash(self):
+        for pw_hash in MALFORMED[:-1]:
+            self.assertTrue(self.hasher.needs_rehash(pw_hash))
+
+    def test_check(self):
+        pw_hash = self.hasher.generate_password_hash('secret12')
+        self.assertTrue(self.hasher.check_password_hash(pw_hash, 'secret12'))
+        self.assertFalse(self.hasher.check_password_hash(pw_hash, 'secret13'))
+        self.assertFalse(self.hasher.needs_rehash(pw_hash))
+        self.assertFalse(check_password('$2b$04$short', 'secret12'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Tests of sending reminders"""
+from datetime import datetime, timedelta
+import itertools
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+os.environ.setdefault('REL8_DB_BACKEND', 'sqlite')
+os.environ.setdefault('REL8_SQLITE_PATH', os.path.join(
+    tempfile.mkdtemp(), 'rel8-test.db'))
+
+import models
+from models.base_model import new_id
+from models.interval import Interval
+from models.outcome import Outcome
+from models.session import Session
+from models.user import User
+from rel8.reminders import ReminderDispatcher, ReminderSender
+from rel8.reminders import StubTransport, TokenBucket
+
+LEAD = timedelta(minutes=15)
+DAYS = itertools.count()
+
+
+class FakeClock:
+    """Stands in for the time module, sleeping only advances the clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Tests of TokenBucket"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('rel8.reminders.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_is_free_then_paced_at_rate(self):
+        bucket = TokenBucket(10, burst=3)
+        for _ in range(3):
+            bucket.acquire()
+        self.assertEqual(self.clock.now, 0)
+        for _ in range(5):
+            bucket.acquire()
+        self.assertAlmostEqual(self.clock.now, 0.5)
+
+    def test_refills_up_to_capacity(self):
+        bucket = TokenBucket(10, burst=2)
+        bucket.acquire()
+        bucket.acquire()
+        self.clock.sleep(60)
+        bucket.acquire()
+        bucket.acquire()
+        self.assertEqual(self.clock.now, 60)
+        bucket.acquire()
+        self.assertAlmostEqual(self.clock.now, 60.1)
+
+
+class TestReminderDispatcher(unittest.TestCase):
+    """Tests of DBStorage.claim_reminders and ReminderDispatcher"""
+
+    def add_user(self, due):
+        storage = models.storage
+        user = User(username='remind-{}'.format(new_id()[:8]),
+                    access_code='0' * 16,
+                    phone_number='+1555{:07d}'.format(
+                        int.from_bytes(os.urandom(3), 'big')))
+        storage.new(user)
+        interval = Interval(duration=1, user_id=user.id)
+        storage.new(interval)
+        storage.new(Outcome(name='headache', user_id=user.id))
+        storage.save()
+        opened = self.now - timedelta(minutes=50)
+        ids = [new_id() for _ in range(due)]
+        storage.bulk_insert(Session, [
+            {'id': session_id, 'created_at': opened, 'updated_at': opened,
+             'user_id': user.id, 'interval_id': interval.id,
+             'complete': False}
+            for session_id in ids])
+        storage.save()
+        storage.close()
+        return user, ids
+
+    def setUp(self):
+        # each test runs a day after the last so no earlier session is due
+        self.now = datetime.utcnow() + timedelta(days=next(DAYS))
+
+    def test_concurrent_claims_are_disjoint(self):
+        user, ids = self.add_user(120)
+        claimed = [[], []]
+
+        def claim(index):
+            for rows in models.storage.claim_reminders(
+                    LEAD, now=self.now, batch_size=15):
+                claimed[index].extend(row[0] for row in rows)
+
+        threads = [threading.Thread(target=claim, args=(index,))
+                   for index in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertFalse(set(claimed[0]) & set(claimed[1]))
+        self.assertEqual(sorted(claimed[0] + claimed[1]), sorted(ids))
+        self.assertEqual(list(models.storage.claim_reminders(
+            LEAD, now=self.now)), [])
+
+    def test_failed_send_leaves_session_claimable(self):
+        user, ids = self.add_user(1)
+        transport = StubTransport(failures=1)
+        dispatcher = ReminderDispatcher(models.storage, ReminderSender(
+            transport, rate=1000, retries=0, backoff=0))
+
+        self.assertEqual(dispatcher.dispatch(now=self.now), (0, 1))
+        self.assertEqual(dispatcher.dispatch(now=self.now), (1, 0))
+        self.assertEqual(transport.sent[0][0], user.phone_number)
+        self.assertEqual(dispatcher.dispatch(now=self.now), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
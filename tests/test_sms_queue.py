@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Tests of Twilio retries with the SMS ingestion queue enabled"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+SCRATCH = tempfile.mkdtemp()
+os.environ.setdefault('REL8_DB_BACKEND', 'sqlite')
+os.environ.setdefault('REL8_SQLITE_PATH', os.path.join(SCRATCH, 'rel8-test.db'))
+os.environ.setdefault('REL8_SMS_QUEUE', os.path.join(SCRATCH, 'queue.db'))
+
+import models
+from models.interval import Interval
+from models.outcome import Outcome
+from models.predictor import Predictor
+from models.user import User
+from rel8 import app as rel8_app
+
+
+class TestQueuedRetries(unittest.TestCase):
+    """Tests of /sms replaying a MessageSid in queue mode"""
+
+    @classmethod
+    def setUpClass(cls):
+        storage = models.storage
+        cls.phone_number = '+15555550123'
+        user = User(username='queued', access_code='0' * 16,
+                    phone_number=cls.phone_number)
+        storage.new(user)
+        storage.new(Interval(duration=1, user_id=user.id))
+        storage.new(Predictor(name='coffee', user_id=user.id))
+        storage.new(Outcome(name='headache', user_id=user.id))
+        storage.save()
+        storage.close()
+        cls.client = rel8_app.app.test_client()
+
+    def post(self, message_sid):
+        return self.client.post('/sms', data={
+            'MessageSid': message_sid, 'From': self.phone_number,
+            'Body': 'coffee'})
+
+    def depth(self):
+        return rel8_app.sms_queue.metrics()['depth']
+
+    def test_retry_is_not_queued_again(self):
+        before = self.depth()
+        first = self.post('SMretry')
+        second = self.post('SMretry')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(self.depth(), before + 1)
+
+    def test_retry_losing_the_race_is_not_queued(self):
+        log = rel8_app.processed_messages
+        get = log.get
+        calls = []
+
+        def racing_get(message_sid):
+            # the first lookup misses, as for a retry that arrived while the
+            # original request was still running
+            calls.append(message_sid)
+            return None if len(calls) == 1 else get(message_sid)
+
+        self.post('SMrace')
+        before = self.depth()
+        with mock.patch.object(log, 'get', side_effect=racing_get):
+            response = self.post('SMrace')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.depth(), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Tests of closing expired sessions"""
+from datetime import datetime, timedelta
+import os
+import tempfile
+import threading
+import unittest
+
+os.environ.setdefault('REL8_DB_BACKEND', 'sqlite')
+os.environ.setdefault('REL8_SQLITE_PATH', os.path.join(
+    tempfile.mkdtemp(), 'rel8-test.db'))
+
+import models
+from models.base_model import new_id
+from models.interval import Interval
+from models.session import Session
+from models.user import User
+from models.user_stat import UserStat
+
+
+class TestCloseExpiredSessions(unittest.TestCase):
+    """Tests of DBStorage.close_expired_sessions"""
+
+    def add_user(self, expired):
+        storage = models.storage
+        user = User(username='sweep-{}'.format(new_id()[:8]),
+                    access_code='0' * 16,
+                    phone_number='+1555{:07d}'.format(
+                        int.from_bytes(os.urandom(3), 'big')))
+        storage.new(user)
+        interval = Interval(duration=1, user_id=user.id)
+        storage.new(interval)
+        storage.save()
+        opened = datetime.utcnow() - timedelta(hours=2)
+        storage.bulk_insert(Session, [
+            {'id': new_id(), 'created_at': opened, 'updated_at': opened,
+             'user_id': user.id, 'interval_id': interval.id,
+             'complete': False}
+            for _ in range(expired)])
+        storage.save()
+        return user
+
+    def unpaired(self, user):
+        models.storage.close()
+        stat = models.storage.get_by(UserStat, user_id=user.id)
+        return stat.unpaired if stat else 0
+
+    def test_sweeps_count_each_closed_session_once(self):
+        users = [self.add_user(150), self.add_user(50)]
+        closed = []
+
+        def sweep():
+            closed.append(models.storage.close_expired_sessions())
+
+        threads = [threading.Thread(target=sweep) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sum(closed), 200)
+        self.assertEqual(self.unpaired(users[0]), 150)
+        self.assertEqual(self.unpaired(users[1]), 50)
+        self.assertEqual(models.storage.close_expired_sessions(), 0)
+        self.assertEqual(self.unpaired(users[0]), 150)
+
+    def test_sweep_creates_missing_stats(self):
+        user = self.add_user(1)
+        self.assertIsNone(models.storage.get_by(UserStat, user_id=user.id))
+        models.storage.close_expired_sessions()
+        self.assertEqual(self.unpaired(user), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()